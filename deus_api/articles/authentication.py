@@ -0,0 +1,87 @@
+"""Authentication classes for the cheaper API_AUTH_MODE settings.
+
+'cached' resolves JWT and DRF token users through the API cache, so a warm
+request runs no authentication query; 'stateless' trusts the claims of a
+valid JWT and builds a StatelessUser without touching the database. Cached
+users keep only CACHED_USER_FIELDS, and the signals in articles.signals
+drop them once a change to the user or its token commits.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .cache import get_cache
+
+
+def user_cache_key(user_id):
+    return f'auth-user:{user_id}'
+
+
+def token_cache_key(key):
+    # never keep raw token keys in the cache
+    return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+# all the API reads from request.user; never the password hash
+CACHED_USER_FIELDS = ('id', 'username', 'is_active', 'is_staff')
+
+
+def cached_user(user_id):
+    fields = get_cache().get(user_cache_key(user_id))
+    if fields is None:
+        return None
+    # the other fields are deferred, so they load if anything reads them
+    model = get_user_model()
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in fields]
+    return model.from_db(None, names, [fields[name] for name in names])
+
+
+def cache_user(user):
+    fields = {name: getattr(user, name) for name in CACHED_USER_FIELDS}
+    get_cache().set(user_cache_key(user.pk), fields, settings.API_AUTH_CACHE_TIMEOUT)
+
+
+def forget_user(user_id):
+    get_cache().delete(user_cache_key(user_id))
+
+
+def forget_token(key):
+    get_cache().delete(token_cache_key(key))
+
+
+class StatelessUser(TokenUser):
+    """TokenUser whose id is the integer primary key, as on User."""
+
+    @cached_property
+    def id(self):
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        user = cached_user(validated_token.get(api_settings.USER_ID_CLAIM))
+        if user is None:
+            # also rejects unknown and inactive users
+            user = super().get_user(validated_token)
+            cache_user(user)
+        return user
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        cache = get_cache()
+        user_id = cache.get(token_cache_key(key))
+        user = cached_user(user_id) if user_id is not None else None
+        if user is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(token_cache_key(key), user.pk, settings.API_AUTH_CACHE_TIMEOUT)
+            cache_user(user)
+            return user, token
+        return user, Token(key=key, user=user)
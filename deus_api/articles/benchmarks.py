@@ -0,0 +1,178 @@
+"""Latency, query count and export throughput measurements for the API.
+
+Besides the endpoints, one page of articles is serialized and rendered
+with ArticleSerializer and with ValuesSerializer (DRF's json and orjson)
+to compare the serializer paths on their own, and the export is downloaded
+in each format to compare sizes and rows per second.
+
+Used by the ``benchmark_api`` management command, which seeds a throwaway
+database, runs :func:`run_benchmarks` and compares the results with a stored
+baseline through :func:`compare`.
+"""
+import importlib.util
+import io
+import math
+import time
+
+from django.db import connection
+from django.db.models import Prefetch
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from .models import Author, Tag, Article
+from .pagination import CustomPagination
+from .serializers import ArticleSerializer, ValuesSerializer
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    index = max(math.ceil(p / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def default_endpoints():
+    """Endpoint name -> path, using names and dates present in the seeded data."""
+    article = Article.objects.order_by('id').first()
+    author = Author.objects.order_by('id').first()
+    tag = Tag.objects.order_by('id').first()
+    keyword = article.title.split()[0].strip('.').lower()
+    date = article.publication_date
+    last_page = max(math.ceil(Article.objects.count() / CustomPagination.page_size), 1)
+    return {
+        'articles_list': '/articles/',
+        'articles_deep_page': f'/articles/?page={last_page}',
+        'articles_keyset': '/articles/?cursor=',
+        'articles_year': f'/articles/?year={date.year}',
+        'articles_month': f'/articles/?month={date.month}',
+        'articles_year_month': f'/articles/?year={date.year}&month={date.month}',
+        'articles_authors': f'/articles/?authors={author.name}',
+        'articles_tags': f'/articles/?tags={tag.name}',
+        'articles_keywords': f'/articles/?keywords={keyword}',
+        'articles_expand': '/articles/?expand=authors,tags,comments_count',
+        'articles_fields': '/articles/?fields=id,title',
+        'article_retrieve': f'/articles/{article.id}/',
+        'comments_list': '/comments/',
+    }
+
+
+def measure(client, path, iterations):
+    def get():
+        response = client.get(path)
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {path} returned {response.status_code}')
+
+    return measure_calls(get, iterations)
+
+
+def measure_calls(call, iterations):
+    latencies = []
+    queries = None
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            call()
+            latencies.append((time.perf_counter() - start) * 1000)
+        queries = len(captured)
+    return {
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'queries': queries,
+    }
+
+
+def export_rows(export_format, content):
+    if export_format == 'parquet':
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(io.BytesIO(content)).metadata.num_rows
+    rows = content.count(b'\n')
+    return rows - 1 if export_format == 'csv' else rows  # csv header
+
+
+def measure_export(client, path='/articles//download/', export_format='csv'):
+    start = time.perf_counter()
+    response = client.get(path, {'format': export_format})
+    first_byte = None
+    chunks = []
+    for chunk in response.streaming_content:
+        if first_byte is None:
+            first_byte = time.perf_counter() - start
+        chunks.append(chunk)
+    elapsed = time.perf_counter() - start
+    content = b''.join(chunks)
+    rows = export_rows(export_format, content)
+    return {
+        'rows': rows,
+        'bytes': len(content),
+        'first_byte_ms': round((first_byte or 0) * 1000, 2),
+        'rows_per_second': round(rows / elapsed, 1) if elapsed else 0,
+    }
+
+
+def export_formats():
+    formats = ['csv', 'jsonl']
+    if importlib.util.find_spec('pyarrow') is not None:
+        formats.append('parquet')
+    return formats
+
+
+def serializer_paths(page_size):
+    """Ways of turning one page of articles into JSON, as name -> callable."""
+    model_page = Article.objects.prefetch_related(
+        Prefetch('authors', queryset=Author.objects.only('id')),
+        Prefetch('tags', queryset=Tag.objects.only('id')),
+    ).order_by('-publication_date', '-id')
+    values_serializer = ValuesSerializer.for_serializer(ArticleSerializer())
+    values_page = values_serializer.rows(Article.objects.order_by('-publication_date', '-id'))
+
+    def model_rows():
+        return ArticleSerializer(list(model_page[:page_size]), many=True).data
+
+    def values_rows():
+        return values_serializer.bind(list(values_page[:page_size])).data
+
+    paths = {'serialize_model_json': lambda: JSONRenderer().render(model_rows())}
+    if importlib.util.find_spec('orjson') is not None:
+        from .renderers import ORJSONRenderer
+
+        paths['serialize_model_orjson'] = lambda: ORJSONRenderer().render(model_rows())
+        paths['serialize_values_orjson'] = lambda: ORJSONRenderer().render(values_rows())
+    return paths
+
+
+def run_benchmarks(client, iterations=20, endpoints=None):
+    endpoints = endpoints or default_endpoints()
+    results = {name: measure(client, path, iterations) for name, path in endpoints.items()}
+    for export_format in export_formats():
+        # 'export' is the CSV download, as in older baselines
+        name = 'export' if export_format == 'csv' else f'export_{export_format}'
+        results[name] = measure_export(client, export_format=export_format)
+    for name, call in serializer_paths(CustomPagination.page_size).items():
+        results[name] = measure_calls(call, iterations)
+    return results
+
+
+def compare(results, baseline, latency_tolerance=0.5, latency_slack_ms=5):
+    """Human-readable regressions of ``results`` against ``baseline``.
+
+    Query counts may not grow at all. Latency (p95) and export throughput
+    may drift by ``latency_tolerance`` as a fraction of the baseline, since
+    they depend on the machine; p95 also gets ``latency_slack_ms`` so that
+    millisecond-sized timings do not fail on noise.
+    """
+    regressions = []
+    for name, expected in baseline.items():
+        actual = results.get(name)
+        if actual is None:
+            continue
+        if 'queries' in expected and actual['queries'] > expected['queries']:
+            regressions.append(f"{name}: {actual['queries']} queries, baseline {expected['queries']}")
+        if 'p95_ms' in expected and actual['p95_ms'] > expected['p95_ms'] * (1 + latency_tolerance) + latency_slack_ms:
+            regressions.append(f"{name}: p95 {actual['p95_ms']}ms, baseline {expected['p95_ms']}ms")
+        if ('rows_per_second' in expected
+                and actual['rows_per_second'] < expected['rows_per_second'] * (1 - latency_tolerance)):
+            regressions.append(
+                f"{name}: {actual['rows_per_second']} rows/s, baseline {expected['rows_per_second']} rows/s"
+            )
+    return regressions
@@ -0,0 +1,134 @@
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def get_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def _version_key(model):
+    return f'api-version:{model._meta.label_lower}'
+
+
+def get_versions(models):
+    """Current cache version of each model, in the given order."""
+    cache = get_cache()
+    keys = [_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # A fresh namespace after eviction, never a reused number.
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_version(*models):
+    """Invalidate every cached response that depends on one of ``models``."""
+    cache = get_cache()
+    for model in models:
+        key = _version_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def bump_version_on_commit(*models):
+    """bump_version() once the current transaction commits, or right away outside one.
+
+    Bumping earlier would let a concurrent request cache the data from
+    before the commit under the new version, where it would stay.
+    """
+    transaction.on_commit(lambda: bump_version(*models))
+
+
+class CachedResponseMixin:
+    """Caches the serialized data of read actions.
+
+    Entries are keyed on the view, action, URL, query params, user scope and
+    the version counters of ``cache_models``, which the signals in
+    articles.signals bump on every write. The key doubles as the ETag, so
+    a client repeating If-None-Match gets a 304 without any query running.
+    """
+    cache_models = ()
+    cache_actions = ('list', 'retrieve')
+    # 'shared' when the representation is the same for every user who may
+    # see it, 'user' to keep a separate entry per user.
+    cache_scope = 'shared'
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.acached_response(super().alist, request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.acached_response(super().aretrieve, request, *args, **kwargs)
+
+    def get_response_cache_key(self, request):
+        scope = 'shared' if self.cache_scope == 'shared' else f'user:{request.user.pk}'
+        parts = [
+            type(self).__name__,
+            self.action,
+            request.get_host(),
+            request.path,
+            sorted(request.query_params.lists()),
+            scope,
+            request.accepted_renderer.format,
+            get_versions(self.cache_models),
+        ]
+        return 'api-response:' + hashlib.md5(repr(parts).encode()).hexdigest()
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not settings.API_CACHE_TIMEOUT or self.action not in self.cache_actions:
+            return handler(request, *args, **kwargs)
+
+        key = self.get_response_cache_key(request)
+        etag = f'"{key.rsplit(":", 1)[1]}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        cache = get_cache()
+        data = cache.get(key)
+        if data is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache.set(key, response.data, settings.API_CACHE_TIMEOUT)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        return response
+
+    async def acached_response(self, handler, request, *args, **kwargs):
+        """cached_response() for coroutine handlers (see articles.async_views)."""
+        if not settings.API_CACHE_TIMEOUT or self.action not in self.cache_actions:
+            return await handler(request, *args, **kwargs)
+
+        key = await sync_to_async(self.get_response_cache_key)(request)
+        etag = f'"{key.rsplit(":", 1)[1]}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        cache = get_cache()
+        data = await cache.aget(key)
+        if data is None:
+            response = await handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            await cache.aset(key, response.data, settings.API_CACHE_TIMEOUT)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        return response
@@ -0,0 +1,96 @@
+"""Primary/replica routing for API requests.
+
+When DATABASES has a 'replica' alias, ``ReplicaRoutingMiddleware`` sends
+the reads of GET/HEAD/OPTIONS requests there and everything else to the
+primary. Replicas lag, so after a successful write the client is pinned to
+the primary for DB_REPLICA_PIN_SECONDS: browsers through a cookie, and
+authenticated API clients, who often keep no cookies, through a flag in
+the API cache that ``PrimaryAfterWriteMixin`` checks once the view has
+authenticated the request.
+"""
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.permissions import SAFE_METHODS
+
+from .cache import get_cache
+
+
+REPLICA = 'replica'
+PIN_COOKIE = 'db_primary'
+
+_read_from_replica = ContextVar('read_from_replica', default=False)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+def use_primary():
+    """Send the remaining reads of the current request to the primary."""
+    _read_from_replica.set(False)
+
+
+def pin_key(user_id):
+    return f'db-pin:{user_id}'
+
+
+def pin_user(user):
+    get_cache().set(pin_key(user.pk), True, settings.DB_REPLICA_PIN_SECONDS)
+
+
+def is_user_pinned(user):
+    return bool(user.is_authenticated and get_cache().get(pin_key(user.pk)))
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _read_from_replica.get() and replica_configured():
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # both aliases hold the same data
+        if {obj1._state.db, obj2._state.db} <= {'default', REPLICA}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db == REPLICA else None
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        if not replica_configured():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        safe = request.method in SAFE_METHODS
+        token = _read_from_replica.set(safe and PIN_COOKIE not in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_from_replica.reset(token)
+        if not safe and response.status_code < 400:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.DB_REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+            )
+            # DRF sets the authenticated user on the Django request too
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                pin_user(user)
+        return response
+
+
+class PrimaryAfterWriteMixin:
+    """Keeps the reads of a user who wrote within DB_REPLICA_PIN_SECONDS on the primary."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if _read_from_replica.get() and is_user_pinned(request.user):
+            use_primary()
@@ -0,0 +1,288 @@
+import csv
+import hashlib
+import json
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.http import QueryDict
+from django_filters.utils import translate_validation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from .filters import ArticleExportFilter
+from .models import Author, Tag, Article
+
+
+CSV_HEADER = ['Title', 'Abstract', 'Publication Date', 'Authors', 'Tags']
+
+
+class Echo:
+    """File-like object whose write() hands the value back instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def export_prefetch():
+    return [
+        Prefetch('authors', queryset=Author.objects.only('name')),
+        Prefetch('tags', queryset=Tag.objects.only('name')),
+    ]
+
+
+def export_params(query_params):
+    """The export filters of a QueryDict as a plain dict, as ExportJob.params stores them."""
+    params = {}
+    for name in ('year', 'month', 'keywords', 'authors_match', 'tags_match'):
+        if query_params.get(name):
+            params[name] = query_params.get(name)
+    for name in ('authors', 'tags'):
+        if query_params.getlist(name):
+            params[name] = query_params.getlist(name)
+    return params
+
+
+def params_hash(export_format, params):
+    """Identifies identical exports; list order does not matter to the filters."""
+    normalized = {
+        name: sorted(value) if isinstance(value, list) else str(value) for name, value in params.items()
+    }
+    return hashlib.sha256(json.dumps([export_format, normalized], sort_keys=True).encode()).hexdigest()
+
+
+def filter_articles(queryset, params):
+    """``queryset`` narrowed by the export filters in ``params``, as export_params() returns them.
+
+    Invalid values raise ValidationError, so the export answers 400 and a
+    job fails with the message.
+    """
+    data = QueryDict(mutable=True)
+    for name, value in params.items():
+        data.setlist(name, value if isinstance(value, list) else [value])
+    filterset = ArticleExportFilter(data, queryset=queryset)
+    if not filterset.is_valid():
+        raise translate_validation(filterset.errors)
+    return filterset.qs
+
+
+def iter_articles(queryset, chunk_size=None):
+    # iterator() uses a server-side cursor on PostgreSQL and, since the
+    # queryset carries prefetch lookups, prefetches authors/tags per chunk.
+    chunk_size = chunk_size or settings.ARTICLE_EXPORT_CHUNK_SIZE
+    return queryset.iterator(chunk_size=chunk_size)
+
+
+def csv_row(article):
+    return [
+        article.title,
+        article.abstract,
+        article.publication_date,
+        ', '.join([author.name for author in article.authors.all()]),
+        ', '.join([tag.name for tag in article.tags.all()])
+    ]
+
+
+def stream_csv(queryset, chunk_size=None):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for article in iter_articles(queryset, chunk_size):
+        yield writer.writerow(csv_row(article))
+
+
+async def astream_csv(queryset, chunk_size=None):
+    """stream_csv() for ASGI: rows come from aiterator(), prefetching per chunk."""
+    chunk_size = chunk_size or settings.ARTICLE_EXPORT_CHUNK_SIZE
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    async for article in queryset.aiterator(chunk_size=chunk_size):
+        yield writer.writerow(csv_row(article))
+
+
+def export_record(article):
+    return {
+        'id': article.id,
+        'title': article.title,
+        'abstract': article.abstract,
+        'publication_date': article.publication_date,
+        'authors': [author.name for author in article.authors.all()],
+        'tags': [tag.name for tag in article.tags.all()],
+    }
+
+
+def jsonl_line(article):
+    return json.dumps(export_record(article), default=str) + '\n'
+
+
+def stream_jsonl(queryset, chunk_size=None):
+    for article in iter_articles(queryset, chunk_size):
+        yield jsonl_line(article)
+
+
+async def astream_jsonl(queryset, chunk_size=None):
+    chunk_size = chunk_size or settings.ARTICLE_EXPORT_CHUNK_SIZE
+    async for article in queryset.aiterator(chunk_size=chunk_size):
+        yield jsonl_line(article)
+
+
+class ByteSink:
+    """Write-only file that keeps what was written until drain() hands it out."""
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        # parquet records absolute offsets, so count everything ever written
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ParquetStream:
+    """Parquet bytes of export records, written one row group per chunk_size records."""
+
+    def __init__(self, chunk_size=None):
+        # optional dependency, only needed for parquet exports
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.chunk_size = chunk_size or settings.ARTICLE_EXPORT_CHUNK_SIZE
+        self.schema = pa.schema([
+            ('id', pa.int64()),
+            ('title', pa.string()),
+            ('abstract', pa.string()),
+            ('publication_date', pa.date32()),
+            ('authors', pa.list_(pa.string())),
+            ('tags', pa.list_(pa.string())),
+        ])
+        self.sink = ByteSink()
+        self.writer = pq.ParquetWriter(pa.PythonFile(self.sink, mode='w'), self.schema)
+        self.batch = []
+        self.rows = 0
+
+    def add(self, article):
+        """Buffers one article; returns the bytes of a finished row group, if any."""
+        self.batch.append(export_record(article))
+        if len(self.batch) < self.chunk_size:
+            return b''
+        self.write_batch()
+        return self.sink.drain()
+
+    def write_batch(self):
+        self.writer.write_table(self.pa.Table.from_pylist(self.batch, schema=self.schema))
+        self.rows += len(self.batch)
+        self.batch = []
+
+    def close(self):
+        """The remaining bytes: the last row group and the footer."""
+        if self.batch or not self.rows:
+            self.write_batch()
+        self.writer.close()
+        return self.sink.drain()
+
+
+def stream_parquet(queryset, chunk_size=None):
+    # one row group per chunk keeps memory flat
+    stream = ParquetStream(chunk_size)
+    for article in iter_articles(queryset, stream.chunk_size):
+        data = stream.add(article)
+        if data:
+            yield data
+    yield stream.close()
+
+
+async def astream_parquet(queryset, chunk_size=None):
+    stream = ParquetStream(chunk_size)
+    async for article in queryset.aiterator(chunk_size=stream.chunk_size):
+        data = stream.add(article)
+        if data:
+            yield data
+    yield stream.close()
+
+
+def write_csv(queryset, path):
+    rows = 0
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(CSV_HEADER)
+        for article in iter_articles(queryset):
+            writer.writerow(csv_row(article))
+            rows += 1
+    return rows
+
+
+def write_jsonl(queryset, path):
+    rows = 0
+    with open(path, 'w') as file:
+        for line in stream_jsonl(queryset):
+            file.write(line)
+            rows += 1
+    return rows
+
+
+def write_parquet(queryset, path, chunk_size=None):
+    stream = ParquetStream(chunk_size)
+    with open(path, 'wb') as file:
+        for article in iter_articles(queryset, stream.chunk_size):
+            file.write(stream.add(article))
+        file.write(stream.close())
+    return stream.rows
+
+
+# format -> (writer, content type, file extension)
+EXPORT_FORMATS = {
+    'csv': (write_csv, 'text/csv', 'csv'),
+    'jsonl': (write_jsonl, 'application/x-ndjson', 'jsonl'),
+    'parquet': (write_parquet, 'application/vnd.apache.parquet', 'parquet'),
+}
+
+# format -> (stream, async stream) for /articles//download/
+EXPORT_STREAMS = {
+    'csv': (stream_csv, astream_csv),
+    'jsonl': (stream_jsonl, astream_jsonl),
+    'parquet': (stream_parquet, astream_parquet),
+}
+
+
+class ExportRenderer(BaseRenderer):
+    """Picks an export format from ?format= or the Accept header.
+
+    Export views stream their body themselves, so only error responses are
+    rendered here, as JSON.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'application/json'
+        return JSONRenderer().render(data)
+
+
+class CSVExportRenderer(ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class JSONLinesExportRenderer(ExportRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'jsonl'
+
+
+class ParquetExportRenderer(ExportRenderer):
+    media_type = 'application/vnd.apache.parquet'
+    format = 'parquet'
@@ -0,0 +1,43 @@
+"""Grouped article counts for /articles/facets/.
+
+Each facet is one GROUP BY over the filtered articles: publication years
+and months together on the article table, tags and authors on their
+through tables restricted to the filtered ids, so no join multiplies the
+article rows and no per-value COUNT(*) runs.
+"""
+from django.db.models import Count
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def date_facets(queryset):
+    rows = list(
+        queryset.order_by().values(year=ExtractYear('publication_date'), month=ExtractMonth('publication_date'))
+        .annotate(count=Count('pk')).order_by('year', 'month')
+    )
+    years = {}
+    for row in rows:
+        years[row['year']] = years.get(row['year'], 0) + row['count']
+    return [{'year': year, 'count': count} for year, count in years.items()], rows
+
+
+def related_facet(queryset, field_name, size):
+    """The ``size`` most frequent targets of ``field_name`` among the articles in ``queryset``."""
+    field = queryset.model._meta.get_field(field_name)
+    articles = field.related_query_name()
+    # the join stops at the through table, whose article ids are matched
+    rows = (
+        field.related_model.objects.filter(**{f'{articles}__in': queryset.order_by().values('pk')})
+        .values('id', 'name').annotate(count=Count(articles)).order_by('-count', 'name', 'id')
+    )
+    return list(rows[:size])
+
+
+def article_facets(queryset, size):
+    years, months = date_facets(queryset)
+    return {
+        'count': sum(year['count'] for year in years),
+        'years': years,
+        'months': months,
+        'tags': related_facet(queryset, 'tags', size),
+        'authors': related_facet(queryset, 'authors', size),
+    }
@@ -0,0 +1,121 @@
+"""FilterSets of the article and comment lists.
+
+The exports and the export worker filter through ArticleExportFilter, so
+this module must not import the views.
+"""
+from datetime import date, datetime, time, MAXYEAR, MINYEAR
+
+from django.db import models
+from django.utils import timezone
+from django_filters import rest_framework as django_filters
+
+from .models import Article, Comment
+from .name_cache import filter_by_names
+
+
+def date_range(year, month=None):
+    """Half-open [start, end) date range covering a year or one of its months."""
+    if month is None:
+        return date(year, 1, 1), date(year + 1, 1, 1)
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+
+MATCH_CHOICES = [('any', 'any'), ('all', 'all')]
+
+
+class PeriodFilterSet(django_filters.FilterSet):
+    """year/month filters applied as half-open ranges of a date or datetime field.
+
+    Ranges can use a B-tree index on the field and let PostgreSQL skip the
+    partitions of a table partitioned on it; month alone cannot.
+    """
+
+    def filter_year(self, queryset, name, value):
+        year = int(value)
+        if not MINYEAR <= year < MAXYEAR:
+            return queryset.none()
+        start, end = self.period_bounds(name, *date_range(year))
+        return queryset.filter(**{f'{name}__gte': start, f'{name}__lt': end})
+
+    def filter_month(self, queryset, name, value):
+        month = int(value)
+        if not 1 <= month <= 12:
+            return queryset.none()
+        year = self.form.cleaned_data.get('year')
+        if year is None:
+            return queryset.filter(**{f'{name}__month': month})
+        year = int(year)
+        if not MINYEAR <= year < MAXYEAR:
+            return queryset.none()
+        start, end = self.period_bounds(name, *date_range(year, month))
+        return queryset.filter(**{f'{name}__gte': start, f'{name}__lt': end})
+
+    def period_bounds(self, name, start, end):
+        if isinstance(self._meta.model._meta.get_field(name), models.DateTimeField):
+            tz = timezone.get_default_timezone()
+            return [timezone.make_aware(datetime.combine(day, time.min), tz) for day in (start, end)]
+        return start, end
+
+
+class ArticleFilter(PeriodFilterSet):
+    # year/month are applied as publication_date ranges so they can use the
+    # (publication_date, id) index; month alone uses the EXTRACT(month) index.
+    year = django_filters.NumberFilter(field_name='publication_date', method='filter_year')
+    month = django_filters.NumberFilter(field_name='publication_date', method='filter_month')
+    # exact names, ignoring case; repeat or comma-separate for several and
+    # pick any (default) or all of them with authors_match/tags_match
+    authors = django_filters.CharFilter(field_name='authors', method='filter_names')
+    tags = django_filters.CharFilter(field_name='tags', method='filter_names')
+    authors_match = django_filters.ChoiceFilter(choices=MATCH_CHOICES, method='filter_match')
+    tags_match = django_filters.ChoiceFilter(choices=MATCH_CHOICES, method='filter_match')
+    keywords = django_filters.CharFilter(field_name='title', method='filter_keywords')
+    # activity, from the counters the comment triggers maintain
+    min_comments = django_filters.NumberFilter(field_name='comment_count', lookup_expr='gte')
+    max_comments = django_filters.NumberFilter(field_name='comment_count', lookup_expr='lte')
+    commented_after = django_filters.IsoDateTimeFilter(field_name='last_commented_at', lookup_expr='gte')
+    commented_before = django_filters.IsoDateTimeFilter(field_name='last_commented_at', lookup_expr='lt')
+
+    def filter_names(self, queryset, name, value):
+        names = self.data.getlist(name) if hasattr(self.data, 'getlist') else [value]
+        return filter_by_names(queryset, name, names, self.form.cleaned_data.get(f'{name}_match') == 'all')
+
+    def filter_match(self, queryset, name, value):
+        # read by filter_names
+        return queryset
+
+    def filter_keywords(self, queryset, name, value):
+        ordering = queryset.query.order_by
+        queryset = queryset.search(value)
+        if ordering:
+            # an explicit ?ordering= wins over relevance
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+    class Meta:
+        model = Article
+        fields = [
+            'year', 'month', 'authors', 'tags', 'authors_match', 'tags_match', 'keywords',
+            'min_comments', 'max_comments', 'commented_after', 'commented_before',
+        ]
+
+
+class ArticleExportFilter(ArticleFilter):
+    # an export is a file to keep, so dates out of range are rejected
+    # rather than producing an empty one
+    year = django_filters.NumberFilter(
+        field_name='publication_date', method='filter_year', min_value=MINYEAR, max_value=MAXYEAR - 1
+    )
+    month = django_filters.NumberFilter(field_name='publication_date', method='filter_month', min_value=1, max_value=12)
+
+
+class CommentFilter(PeriodFilterSet):
+    # created_at ranges, so only the matching partitions are read once the
+    # table is partitioned (manage.py partition_comments)
+    year = django_filters.NumberFilter(field_name='created_at', method='filter_year')
+    month = django_filters.NumberFilter(field_name='created_at', method='filter_month')
+
+    class Meta:
+        model = Comment
+        fields = ['article', 'year', 'month']
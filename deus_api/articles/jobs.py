@@ -0,0 +1,75 @@
+"""The database-backed queue behind /exports/.
+
+Jobs are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so any number of
+`run_export_worker` processes can share the table without a broker.
+"""
+import os
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .exports import EXPORT_FORMATS, export_prefetch, filter_articles
+from .models import Article, ExportJob
+
+
+def reusable_job(export_format, params_hash):
+    """A queued, running or recently finished job producing the same file."""
+    fresh = timezone.now() - timedelta(seconds=settings.API_EXPORT_MAX_AGE)
+    return ExportJob.objects.filter(
+        Q(status__in=[ExportJob.PENDING, ExportJob.RUNNING]) | Q(status=ExportJob.DONE, finished_at__gte=fresh),
+        format=export_format,
+        params_hash=params_hash,
+    ).order_by('-created_at').first()
+
+
+def claim_job():
+    """Mark the oldest pending job (or one whose worker died) as running and return it."""
+    stale = timezone.now() - timedelta(seconds=settings.API_EXPORT_JOB_TIMEOUT)
+    with transaction.atomic():
+        job = (
+            ExportJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=ExportJob.PENDING) | Q(status=ExportJob.RUNNING, started_at__lt=stale))
+            .order_by('created_at')
+            .first()
+        )
+        if job is not None:
+            job.status = ExportJob.RUNNING
+            job.started_at = timezone.now()
+            job.save(update_fields=['status', 'started_at'])
+    return job
+
+
+def run_job(job):
+    writer, _, extension = EXPORT_FORMATS[job.format]
+    handle, path = tempfile.mkstemp(suffix=f'.{extension}')
+    os.close(handle)
+    try:
+        # stored params may no longer validate; that fails the job too
+        queryset = filter_articles(Article.objects.prefetch_related(*export_prefetch()), job.params)
+        job.rows = writer(queryset, path)
+        with open(path, 'rb') as file:
+            job.file.save(f'articles-{job.id}.{extension}', File(file), save=False)
+        job.status = ExportJob.DONE
+    except Exception as exc:
+        job.status = ExportJob.FAILED
+        job.error = f'{type(exc).__name__}: {exc}'
+    finally:
+        os.remove(path)
+    job.finished_at = timezone.now()
+    job.save()
+    return job
+
+
+def prune_jobs():
+    """Delete finished jobs, and their files, older than API_EXPORT_RETENTION."""
+    expired = timezone.now() - timedelta(seconds=settings.API_EXPORT_RETENTION)
+    jobs = ExportJob.objects.filter(status__in=[ExportJob.DONE, ExportJob.FAILED], finished_at__lt=expired)
+    for job in jobs:
+        if job.file:
+            job.file.delete(save=False)
+    return jobs.delete()[0]
@@ -0,0 +1,79 @@
+import json
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from articles.benchmarks import compare, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database, measure latency percentiles, queries per '
+        'request and export throughput of the API, and compare them with a baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--articles', type=int, default=2000)
+        parser.add_argument('--comments', type=int, default=4000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--baseline', default=str(settings.BASE_DIR / 'benchmarks' / 'baseline.json'))
+        parser.add_argument('--save', action='store_true', help='Write the results as the new baseline.')
+        parser.add_argument('--check', action='store_true', help='Fail if the results regress from the baseline.')
+        parser.add_argument('--latency-tolerance', type=float, default=0.5,
+                            help='Allowed latency/throughput drift as a fraction of the baseline.')
+        parser.add_argument('--cached', action='store_true', help='Keep the response cache enabled.')
+        parser.add_argument('--values-serializers', action='store_true',
+                            help='Serve the endpoints with API_VALUES_SERIALIZERS on.')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            results = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(json.dumps(results, indent=2))
+        baseline_path = Path(options['baseline'])
+        if options['save']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(f'Baseline written to {baseline_path}')
+        if options['check']:
+            if not baseline_path.exists():
+                raise CommandError(f'No baseline at {baseline_path}; run with --save first.')
+            regressions = compare(results, json.loads(baseline_path.read_text()), options['latency_tolerance'])
+            if regressions:
+                raise CommandError('Regressions:\n' + '\n'.join(regressions))
+            self.stdout.write('No regressions.')
+
+    def run(self, options):
+        call_command(
+            'populate_fake_data',
+            articles=options['articles'],
+            comments=options['comments'],
+            seed=options['seed'],
+            copy=True,
+            stdout=StringIO(),
+        )
+        user = User.objects.get(username='george')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+        cache_timeout = settings.API_CACHE_TIMEOUT if options['cached'] else 0
+        values_serializers = options['values_serializers'] or settings.API_VALUES_SERIALIZERS
+        # no throttling, which would refuse the repeated requests
+        with override_settings(
+            API_CACHE_TIMEOUT=cache_timeout, API_VALUES_SERIALIZERS=values_serializers, API_THROTTLE_RATES={}
+        ):
+            return run_benchmarks(client, options['iterations'])
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from articles import partitioning
+from articles.models import Comment
+
+
+class Command(BaseCommand):
+    help = (
+        'Partition the comment table by year of created_at (--convert), create the partitions '
+        'of the coming years and detach those of past years (see articles.partitioning).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true',
+                            help='Convert the existing table first; locks it while the rows are copied.')
+        parser.add_argument('--ahead', type=int, default=2,
+                            help='Years after the current one to create partitions for.')
+        parser.add_argument('--detach-before', type=int, metavar='YEAR',
+                            help='Detach the partitions of the years before YEAR, keeping them as tables.')
+
+    def handle(self, *args, **options):
+        last_year = timezone.now().year + options['ahead']
+        with connection.cursor() as cursor:
+            partitioned = partitioning.is_partitioned(cursor)
+        if options['convert']:
+            if partitioned:
+                raise CommandError(f'{partitioning.TABLE} is already partitioned.')
+            span = Comment.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+            first_year = span['first'].year if span['first'] else timezone.now().year
+            if span['last']:
+                last_year = max(last_year, span['last'].year)
+            partitioning.convert(first_year, last_year)
+            self.stdout.write(f'Partitioned {partitioning.TABLE} from {first_year} to {last_year}.')
+        elif not partitioned:
+            raise CommandError(f'{partitioning.TABLE} is not partitioned; run with --convert first.')
+        else:
+            for year in partitioning.ensure_partitions(timezone.now().year, last_year):
+                self.stdout.write(f'Created {partitioning.partition_name(year)}.')
+        if options['detach_before']:
+            for name in partitioning.detach_before(options['detach_before']):
+                self.stdout.write(f'Detached {name}.')
@@ -1,34 +1,248 @@
-from django.core.management.base import BaseCommand
+from array import array
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+from multiprocessing import Pool
 import random
+
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils import timezone
 from faker import Faker
+
+from articles.cache import bump_version
 from articles.models import Author, Tag, Article, Comment
-from datetime import timedelta
+
+
+PUBLICATION_DAYS = 3 * 365
+
+
+def chunk_faker(seed, chunk):
+    # Every chunk gets its own generators seeded from (seed, chunk), so the
+    # output does not depend on how chunks are spread over worker processes.
+    fake = Faker()
+    rng = random.Random()
+    if seed is not None:
+        fake.seed_instance(f'{seed}-{chunk}')
+        rng.seed(f'{seed}-{chunk}')
+    return fake, rng
+
+
+def generate_articles(spec):
+    seed, chunk, count, n_authors, n_tags, n_users = spec
+    fake, rng = chunk_faker(seed, chunk)
+    return [
+        (
+            fake.sentence(),
+            fake.paragraph(),
+            rng.randrange(PUBLICATION_DAYS + 1),
+            rng.randrange(n_users),
+            rng.randrange(n_authors),
+            rng.sample(range(n_tags), k=rng.randint(1, min(5, n_tags))),
+        )
+        for _ in range(count)
+    ]
+
+
+def generate_comments(spec):
+    seed, chunk, count, n_articles, n_users = spec
+    fake, rng = chunk_faker(seed, chunk)
+    # the last value places the comment between its article's publication and now
+    return [
+        (rng.randrange(n_articles), rng.randrange(n_users), fake.paragraph(), rng.random())
+        for _ in range(count)
+    ]
+
+
+def copy_value(value):
+    """One column in COPY text format."""
+    if value is None:
+        return '\\N'
+    return (
+        str(value).replace('\\', '\\\\').replace('\t', '\\t')
+        .replace('\n', '\\n').replace('\r', '\\r')
+    )
+
+
+def unique_names(fake, count, make, existing=()):
+    names = []
+    seen = {name.lower() for name in existing}
+    for i in range(count):
+        name = make(fake)
+        if name.lower() in seen:
+            name = f'{name}-{i}'
+        seen.add(name.lower())
+        names.append(name)
+    return names
+
 
 class Command(BaseCommand):
-    def handle(self, *args, **kwargs):
-
-        fake = Faker()
-        tags = [Tag.objects.create(name=fake.word()) for _ in range(5)]
-        authors = [Author.objects.create(name=fake.name(), email=fake.email()) for _ in range(5)]
-        users = [User.objects.create_user(username=fake.user_name(), email=fake.email()) for _ in range(5)]
-        #known user with name:george pass 123 
-        users.append(User.objects.create_user(username='george', email='george@example.com', password='123'))
-
-
-        for _ in range(500):
-            title = fake.sentence()
-            abstract = fake.paragraph()
-            publication_date = fake.date_between(start_date='-3y', end_date='today')
-            author = random.choice(authors)
-            tags_for_article = random.sample(tags, k=random.randint(1, 5))
-            user = random.choice(users)
-            article = Article.objects.create(title=title, abstract=abstract, publication_date=publication_date, user=user)
-            article.authors.add(author)
-            article.tags.add(*tags_for_article)
-
-        for _ in range(350):
-            article = random.choice(Article.objects.all())
-            user= random.choice(users)
-            text = fake.paragraph()
-            Comment.objects.create(article=article, user=user, text=text)
+    help = 'Fill the database with fake authors, tags, users, articles and comments.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--articles', type=int, default=500)
+        parser.add_argument('--comments', type=int, default=350)
+        parser.add_argument('--authors', type=int, default=5)
+        parser.add_argument('--tags', type=int, default=5)
+        parser.add_argument('--users', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows generated and inserted per chunk.')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes generating fake text in parallel.')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Seed for reproducible data.')
+        parser.add_argument('--copy', action='store_true',
+                            help='Load articles, comments and relations with COPY instead of INSERT.')
+
+    def handle(self, *args, **options):
+        self.seed = options['seed']
+        self.batch_size = options['batch_size']
+        self.copy = options['copy']
+        workers = options['workers']
+        if options['articles'] > 0:
+            # every article gets an author and at least one tag
+            for name in ('authors', 'tags'):
+                if options[name] < 1:
+                    raise CommandError(f'--{name} must be at least 1 to create articles.')
+        self.start_date = date.today() - timedelta(days=PUBLICATION_DAYS)
+
+        fake, _ = chunk_faker(self.seed, 'base')
+        tags = Tag.objects.bulk_create(
+            [Tag(name=name) for name in unique_names(
+                fake, options['tags'], lambda f: f.word(), Tag.objects.values_list('name', flat=True)
+            )],
+            batch_size=self.batch_size
+        )
+        authors = Author.objects.bulk_create(
+            [Author(name=fake.name(), email=fake.email()) for _ in range(options['authors'])],
+            batch_size=self.batch_size
+        )
+        unusable_password = make_password(None)
+        users = User.objects.bulk_create(
+            [
+                User(username=name, email=fake.email(), password=unusable_password)
+                for name in unique_names(
+                    fake, options['users'], lambda f: f.user_name(), User.objects.values_list('username', flat=True)
+                )
+            ],
+            batch_size=self.batch_size
+        )
+        #known user with name:george pass 123; also owns rows when --users is 0
+        george = User.objects.filter(username='george').first()
+        if george is None:
+            george = User.objects.create_user(username='george', email='george@example.com', password='123')
+        users.append(george)
+
+        tag_ids = [tag.pk for tag in tags]
+        author_ids = [author.pk for author in authors]
+        user_ids = [user.pk for user in users]
+
+        # Worker processes only generate text; all writes stay in this one.
+        pool = None
+        if workers > 1:
+            connections.close_all()
+            pool = Pool(workers)
+        try:
+            article_ids, article_days = self.create_articles(pool, options['articles'], author_ids, tag_ids, user_ids)
+            self.create_comments(pool, options['comments'], article_ids, article_days, user_ids)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        # rows were written without signals; drop cached API responses once
+        bump_version(Tag, Author, Article, Comment)
+
+    def chunks(self, total):
+        for chunk, start in enumerate(range(0, total, self.batch_size)):
+            yield chunk, min(self.batch_size, total - start)
+
+    def generate(self, pool, func, specs):
+        return pool.imap(func, specs) if pool is not None else map(func, specs)
+
+    def reserve_ids(self, model, count):
+        # Taking ids from the sequence up front lets relation rows be built
+        # without reading the inserted rows back.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                [model._meta.db_table, count]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def insert_rows(self, model, columns, rows):
+        if not self.copy:
+            objs = [model(**dict(zip(columns, row))) for row in rows]
+            # bulk_create() stamps auto_now_add fields with now(); write the
+            # generated values back over the stamp.
+            stamped = [column for column in columns if getattr(model._meta.get_field(column), 'auto_now_add', False)]
+            with transaction.atomic():
+                model.objects.bulk_create(objs)
+                if stamped:
+                    for obj, row in zip(objs, rows):
+                        for column in stamped:
+                            setattr(obj, column, row[columns.index(column)])
+                    model.objects.bulk_update(objs, stamped)
+            return
+        data = ''.join('\t'.join(copy_value(value) for value in row) + '\n' for row in rows)
+        sql = f'COPY {model._meta.db_table} ({", ".join(columns)}) FROM STDIN'
+        with connection.cursor() as cursor:
+            raw = cursor.cursor
+            if hasattr(raw, 'copy'):  # psycopg 3
+                with raw.copy(sql) as copy:
+                    copy.write(data)
+            else:
+                raw.copy_expert(sql, StringIO(data))
+
+    def create_articles(self, pool, total, author_ids, tag_ids, user_ids):
+        specs = [
+            (self.seed, chunk, count, len(author_ids), len(tag_ids), len(user_ids))
+            for chunk, count in self.chunks(total)
+        ]
+        article_ids = array('q')
+        article_days = array('l')
+
+        for rows in self.generate(pool, generate_articles, specs):
+            ids = self.reserve_ids(Article, len(rows))
+            with transaction.atomic():
+                self.insert_rows(
+                    Article,
+                    ['id', 'title', 'abstract', 'publication_date', 'user_id'],
+                    [
+                        (pk, title, abstract, self.start_date + timedelta(days=days), user_ids[user])
+                        for pk, (title, abstract, days, user, _, _) in zip(ids, rows)
+                    ]
+                )
+                self.insert_rows(
+                    Article.authors.through,
+                    ['article_id', 'author_id'],
+                    [(pk, author_ids[row[4]]) for pk, row in zip(ids, rows)]
+                )
+                self.insert_rows(
+                    Article.tags.through,
+                    ['article_id', 'tag_id'],
+                    [(pk, tag_ids[tag]) for pk, row in zip(ids, rows) for tag in row[5]]
+                )
+            article_ids.extend(ids)
+            article_days.extend(row[2] for row in rows)
+            self.stdout.write(f'articles: {len(article_ids)}/{total}')
+        return article_ids, article_days
+
+    def create_comments(self, pool, total, article_ids, article_days, user_ids):
+        if not article_ids:
+            return
+        specs = [
+            (self.seed, chunk, count, len(article_ids), len(user_ids))
+            for chunk, count in self.chunks(total)
+        ]
+        start = timezone.make_aware(datetime.combine(self.start_date, time.min))
+        created = 0
+        for rows in self.generate(pool, generate_comments, specs):
+            now = timezone.now()
+            comments = []
+            for article, user, text, position in rows:
+                published = start + timedelta(days=article_days[article])
+                comments.append((article_ids[article], user_ids[user], text, published + (now - published) * position))
+            self.insert_rows(Comment, ['article_id', 'user_id', 'text', 'created_at'], comments)
+            created += len(rows)
+            self.stdout.write(f'comments: {created}/{total}')
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from articles.cache import bump_version
+from articles.models import Article
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute comment_count and last_commented_at of every article from its '
+        'comments, e.g. after loading data with the comment triggers disabled.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Articles updated per transaction.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = Article.objects.aggregate(last=Max('id'))['last'] or 0
+        updated = 0
+        for start in range(0, last_id + 1, batch_size):
+            with transaction.atomic():
+                updated += Article.objects.filter(id__gte=start, id__lt=start + batch_size).refresh_comment_stats()
+        bump_version(Article)
+        self.stdout.write(f'Rebuilt comment stats of {updated} articles.')
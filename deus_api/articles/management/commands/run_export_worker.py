@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from articles.jobs import claim_job, prune_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Produce the files of queued article export jobs (see /exports/).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty instead of polling.')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait between polls of an empty queue.')
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_job()
+            if job is not None:
+                run_job(job)
+                self.stdout.write(f'{job}: {job.rows if job.rows is not None else job.error}')
+                continue
+            pruned = prune_jobs()
+            if pruned:
+                self.stdout.write(f'Pruned {pruned} expired jobs.')
+            if options['once']:
+                return
+            time.sleep(options['poll_interval'])
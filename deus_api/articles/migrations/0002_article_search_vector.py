@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:46
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # A stored generated column is computed for every existing row when it is
+    # added, so the ALTER TABLE below also backfills the search vectors.
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('title', config='english', weight='A'), '||', django.contrib.postgres.search.SearchVector('abstract', config='english', weight='B'), django.contrib.postgres.search.SearchConfig('english')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='article_search_vector_gin'),
+        ),
+        # Trigram index backing the optional partial-word fallback. pg_trgm
+        # ships with the contrib package; skip the index where it is missing.
+        migrations.RunSQL(
+            sql="""
+            DO $$
+            BEGIN
+                IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+                    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+                    CREATE INDEX IF NOT EXISTS article_title_trgm
+                        ON articles_article USING gin (title gin_trgm_ops);
+                END IF;
+            END
+            $$;
+            """,
+            reverse_sql='DROP INDEX IF EXISTS article_title_trgm;',
+        ),
+    ]
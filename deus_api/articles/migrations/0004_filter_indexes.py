@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:49
+
+import django.db.models.functions.datetime
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0003_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(django.db.models.functions.datetime.ExtractMonth('publication_date'), name='article_pub_month_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['title'], name='article_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['article', 'created_at'], name='comment_article_created_idx'),
+        ),
+        # The authors/tags filters are icontains, i.e. UPPER(name) LIKE
+        # '%...%'; trigram indexes on the same expression serve them.
+        # Skipped where the pg_trgm contrib extension is not available.
+        migrations.RunSQL(
+            sql="""
+            DO $$
+            BEGIN
+                IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+                    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+                    CREATE INDEX IF NOT EXISTS author_name_upper_trgm
+                        ON articles_author USING gin (UPPER(name::text) gin_trgm_ops);
+                    CREATE INDEX IF NOT EXISTS tag_name_upper_trgm
+                        ON articles_tag USING gin (UPPER(name::text) gin_trgm_ops);
+                END IF;
+            END
+            $$;
+            """,
+            reverse_sql="""
+            DROP INDEX IF EXISTS author_name_upper_trgm;
+            DROP INDEX IF EXISTS tag_name_upper_trgm;
+            """,
+        ),
+    ]
@@ -0,0 +1,108 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0004_filter_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='comment_count',
+            field=models.PositiveIntegerField(db_default=0, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='last_commented_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['comment_count', 'id'], name='article_comment_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(models.OrderBy(models.F('last_commented_at'), descending=True, nulls_last=True), models.OrderBy(models.F('id'), descending=True), name='article_last_commented_idx'),
+        ),
+        # Statement-level triggers keep the counters exact for every write
+        # path (ORM saves, bulk_create, COPY, cascaded deletes) with one
+        # UPDATE per statement rather than one per comment.
+        migrations.RunSQL(
+            sql="""
+            CREATE FUNCTION articles_comment_inserted() RETURNS trigger AS $$
+            BEGIN
+                UPDATE articles_article a
+                SET comment_count = a.comment_count + n.count,
+                    last_commented_at = GREATEST(a.last_commented_at, n.last)
+                FROM (
+                    SELECT article_id, count(*) AS count, max(created_at) AS last
+                    FROM new_rows GROUP BY article_id
+                ) n
+                WHERE a.id = n.article_id;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql;
+
+            CREATE FUNCTION articles_comment_deleted() RETURNS trigger AS $$
+            BEGIN
+                UPDATE articles_article a
+                SET comment_count = a.comment_count - d.count,
+                    last_commented_at = (
+                        SELECT max(c.created_at) FROM articles_comment c WHERE c.article_id = a.id
+                    )
+                FROM (SELECT article_id, count(*) AS count FROM old_rows GROUP BY article_id) d
+                WHERE a.id = d.article_id;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql;
+
+            CREATE FUNCTION articles_comment_updated() RETURNS trigger AS $$
+            BEGIN
+                UPDATE articles_article a
+                SET comment_count = (SELECT count(*) FROM articles_comment c WHERE c.article_id = a.id),
+                    last_commented_at = (
+                        SELECT max(c.created_at) FROM articles_comment c WHERE c.article_id = a.id
+                    )
+                WHERE a.id IN (
+                    SELECT unnest(ARRAY[o.article_id, n.article_id])
+                    FROM old_rows o JOIN new_rows n ON n.id = o.id
+                    WHERE o.article_id <> n.article_id OR o.created_at IS DISTINCT FROM n.created_at
+                );
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql;
+
+            CREATE TRIGGER articles_comment_inserted AFTER INSERT ON articles_comment
+                REFERENCING NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION articles_comment_inserted();
+            CREATE TRIGGER articles_comment_deleted AFTER DELETE ON articles_comment
+                REFERENCING OLD TABLE AS old_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION articles_comment_deleted();
+            CREATE TRIGGER articles_comment_updated AFTER UPDATE ON articles_comment
+                REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION articles_comment_updated();
+
+            UPDATE articles_article a
+            SET comment_count = s.count, last_commented_at = s.last
+            FROM (
+                SELECT article_id, count(*) AS count, max(created_at) AS last
+                FROM articles_comment GROUP BY article_id
+            ) s
+            WHERE a.id = s.article_id;
+            """,
+            reverse_sql="""
+            DROP TRIGGER IF EXISTS articles_comment_inserted ON articles_comment;
+            DROP TRIGGER IF EXISTS articles_comment_deleted ON articles_comment;
+            DROP TRIGGER IF EXISTS articles_comment_updated ON articles_comment;
+            DROP FUNCTION IF EXISTS articles_comment_inserted();
+            DROP FUNCTION IF EXISTS articles_comment_deleted();
+            DROP FUNCTION IF EXISTS articles_comment_updated();
+            """,
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:29
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+def merge_duplicate_tags(apps, schema_editor):
+    """Fold tags whose names differ only in case into the oldest of them."""
+    Tag = apps.get_model('articles', 'Tag')
+    Through = apps.get_model('articles', 'Article').tags.through
+    keep = {}
+    for tag in Tag.objects.order_by('id'):
+        keeper = keep.setdefault(tag.name.lower(), tag.id)
+        if keeper == tag.id:
+            continue
+        linked = Through.objects.filter(tag_id=keeper).values('article_id')
+        Through.objects.filter(tag_id=tag.id, article_id__in=linked).delete()
+        Through.objects.filter(tag_id=tag.id).update(tag_id=keeper)
+        tag.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0006_exportjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_tags, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('name'), name='tag_name_ci_unique'),
+        ),
+        # the authors/tags filters no longer use icontains
+        migrations.RunSQL(
+            sql="""
+            DROP INDEX IF EXISTS author_name_upper_trgm;
+            DROP INDEX IF EXISTS tag_name_upper_trgm;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
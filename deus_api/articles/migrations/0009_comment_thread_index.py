@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0008_change_log'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # the new index covers the old one's lookups; build it before dropping that
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['article', 'created_at', 'id'], name='comment_article_created_id_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='comment_article_created_idx',
+        ),
+    ]
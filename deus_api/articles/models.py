@@ -1,5 +1,13 @@
+import uuid
+
+from django.conf import settings
 from django.db import models
+from django.db.models import Count, Max, Subquery
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, ExtractMonth, Lower, Now
 from django.contrib.auth.models import User  
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, SearchVectorField
 
 class Author(models.Model):
     name = models.CharField(max_length=100)
@@ -11,10 +19,50 @@ class Author(models.Model):
 class Tag(models.Model):
     name = models.CharField(max_length=50)
 
+    class Meta:
+        constraints = [
+            # the tags filter matches names ignoring case
+            models.UniqueConstraint(Lower('name'), name='tag_name_ci_unique'),
+        ]
+
     def __str__(self):
         return self.name
 
 
+SEARCH_CONFIG = 'english'
+
+
+class ArticleQuerySet(models.QuerySet):
+    def search(self, value):
+        """Full-text search over title and abstract, best matches first.
+
+        Uses the GIN-indexed ``search_vector`` column. With
+        ``ARTICLE_SEARCH_TRIGRAM_FALLBACK`` enabled, titles that merely
+        resemble a partial word (pg_trgm word similarity) match as well.
+        """
+        query = SearchQuery(value, search_type='websearch', config=SEARCH_CONFIG)
+        condition = models.Q(search_vector=query)
+        if settings.ARTICLE_SEARCH_TRIGRAM_FALLBACK:
+            condition |= models.Q(title__trigram_word_similar=value)
+        return self.filter(condition).annotate(
+            rank=SearchRank(models.F('search_vector'), query)
+        ).order_by('-rank', '-id')
+
+    def refresh_comment_stats(self):
+        """Recompute comment_count and last_commented_at from the comments table."""
+        comments = Comment.objects.filter(article=models.OuterRef('pk')).order_by().values('article')
+        return self.update(
+            comment_count=Coalesce(Subquery(comments.annotate(count=Count('pk')).values('count')), 0),
+            last_commented_at=Subquery(comments.annotate(last=Max('created_at')).values('last')),
+        )
+
+
+class ArticleManager(models.Manager.from_queryset(ArticleQuerySet)):
+    def get_queryset(self):
+        # search_vector only exists to be matched in SQL; never load it
+        return super().get_queryset().defer('search_vector')
+
+
 class Article(models.Model):
     title = models.CharField(max_length=200)
     abstract = models.TextField()
@@ -22,6 +70,37 @@ class Article(models.Model):
     tags = models.ManyToManyField(Tag, related_name='articles')
     publication_date = models.DateField()
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='articles')
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('abstract', weight='B', config=SEARCH_CONFIG)
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+    # Maintained by the articles_comment triggers (see migration 0005);
+    # rebuild with `manage.py rebuild_article_stats`.
+    comment_count = models.PositiveIntegerField(default=0, db_default=0, editable=False)
+    last_commented_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # db defaults cover rows written with COPY
+    created_at = models.DateTimeField(auto_now_add=True, db_default=Now())
+    updated_at = models.DateTimeField(auto_now=True, db_default=Now())
+
+    objects = ArticleManager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='article_search_vector_gin'),
+            models.Index(fields=['publication_date', 'id'], name='article_pubdate_id_idx'),
+            models.Index(ExtractMonth('publication_date'), name='article_pub_month_idx'),
+            models.Index(fields=['title'], name='article_title_idx'),
+            models.Index(fields=['comment_count', 'id'], name='article_comment_count_idx'),
+            # most recently commented first, never-commented articles last
+            models.Index(
+                models.F('last_commented_at').desc(nulls_last=True), models.F('id').desc(),
+                name='article_last_commented_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -32,5 +111,91 @@ class Comment(models.Model):
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='comment_created_id_idx'),
+            # one article's thread in (created_at, id) order, either direction
+            models.Index(fields=['article', 'created_at', 'id'], name='comment_article_created_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"Comment by {self.user} on {self.article}"
+
+class ExportJob(models.Model):
+    """A background article export, produced by `manage.py run_export_worker`."""
+    FORMAT_CHOICES = [('csv', 'CSV'), ('jsonl', 'JSON Lines'), ('parquet', 'Parquet')]
+    PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='export_jobs')
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='csv')
+    # the filters ArticleExport accepts, normalized (see exports.export_params)
+    params = models.JSONField(default=dict)
+    params_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    file = models.FileField(upload_to='exports/', blank=True)
+    rows = models.PositiveIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='exportjob_queue_idx'),
+            models.Index(fields=['params_hash', 'format', 'status'], name='exportjob_dedupe_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.format} export {self.id} ({self.status})'
+
+
+class CurrentTransactionId(models.Func):
+    """The id of the current transaction, assigning one if needed."""
+    template = 'pg_current_xact_id()::text::bigint'
+    output_field = models.BigIntegerField()
+
+
+class ChangeLogQuerySet(models.QuerySet):
+    def record(self, model, ids, action):
+        return self.bulk_create([
+            self.model(model=model._meta.model_name, object_id=pk, action=action) for pk in ids
+        ])
+
+    def settled(self):
+        """Entries of transactions that have ended.
+
+        Entries become visible when their transaction commits, which is not
+        in id order. Below the snapshot's xmin every transaction has ended,
+        so reading (txid, id) in order up to it never skips an entry that
+        commits later.
+        """
+        return self.filter(txid__lt=RawSQL('pg_snapshot_xmin(pg_current_snapshot())::text::bigint', []))
+
+
+class ChangeLogEntry(models.Model):
+    """One insert, update or delete of an article or comment, for the /changes/ feed.
+
+    Written by the receivers in articles.signals; entries name the object,
+    whose current state is read from its own endpoint.
+    """
+    CREATE, UPDATE, DELETE = 'create', 'update', 'delete'
+    ACTION_CHOICES = [(CREATE, 'Create'), (UPDATE, 'Update'), (DELETE, 'Delete')]
+
+    id = models.BigAutoField(primary_key=True)
+    txid = models.BigIntegerField(db_default=CurrentTransactionId(), editable=False)
+    model = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    changed_at = models.DateTimeField(db_default=Now(), editable=False)
+
+    objects = ChangeLogQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['txid', 'id'], name='changelog_txid_id_idx'),
+        ]
+
     def __str__(self):
-        return f"Comment by {self.user} on {self.article}"
\ No newline at end of file
+        return f'{self.action} {self.model} {self.object_id}'
@@ -0,0 +1,88 @@
+"""In-process name -> id maps for the small Author and Tag tables.
+
+The authors/tags filters resolve names here and then filter the through
+tables on integer ids. A map is reloaded when its model's version in
+articles.cache changes; the signals bump it on every write, so processes
+pick up each other's changes on their next lookup. Clearing the cache
+drops the version keys, which reloads every map as well.
+"""
+import threading
+
+from django.db.models import Exists, OuterRef
+
+from .cache import get_versions
+from .models import Author, Tag
+
+
+def normalize(name):
+    return name.strip().lower()
+
+
+def split_names(values):
+    """Names from repeated and/or comma-separated parameter values."""
+    return [name for value in values for name in value.split(',') if normalize(name)]
+
+
+class NameCache:
+    def __init__(self, model):
+        self.model = model
+        self.lock = threading.Lock()
+        self.version = None
+        self.ids = {}
+
+    def clear(self):
+        with self.lock:
+            self.version = None
+            self.ids = {}
+
+    def load(self):
+        ids = {}
+        for pk, name in self.model.objects.values_list('pk', 'name'):
+            ids.setdefault(normalize(name), []).append(pk)
+        return ids
+
+    def get_ids(self, name):
+        """Ids of the rows named ``name``, ignoring case; several authors may share a name."""
+        version = get_versions([self.model])[0]
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.ids = self.load()
+                    self.version = version
+        return self.ids.get(normalize(name), [])
+
+
+name_caches = {Author: NameCache(Author), Tag: NameCache(Tag)}
+
+
+def clear_name_caches():
+    """Drop every map; the next lookup reloads it from the database."""
+    for name_cache in name_caches.values():
+        name_cache.clear()
+
+
+def filter_by_names(queryset, field_name, names, match_all=False):
+    """Articles related through ``field_name`` to any (or every) one of ``names``.
+
+    Each name becomes an EXISTS over the through table's (article, target)
+    index, so no join multiplies the article rows.
+    """
+    field = queryset.model._meta.get_field(field_name)
+    through = field.remote_field.through
+    source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+    cache = name_caches[field.related_model]
+
+    def related_to(ids):
+        return Exists(through.objects.filter(**{source: OuterRef('pk'), f'{target}__in': ids}))
+
+    id_sets = [cache.get_ids(name) for name in split_names(names)]
+    if not id_sets:
+        return queryset
+    if match_all:
+        if not all(id_sets):
+            return queryset.none()
+        for ids in id_sets:
+            queryset = queryset.filter(related_to(ids))
+        return queryset
+    ids = sorted({pk for ids in id_sets for pk in ids})
+    return queryset.filter(related_to(ids)) if ids else queryset.none()
@@ -0,0 +1,208 @@
+import base64
+import binascii
+import datetime
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def estimate_count(queryset):
+    """Row count estimate that never scans the table.
+
+    Unfiltered querysets read the planner statistics in pg_class.reltuples;
+    filtered ones (or tables that were never analyzed) use the row estimate
+    of the query plan.
+    """
+    if not queryset.query.where:
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return row[0]
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def _seek_condition(ordering, values):
+    # (a, b) after (x, y) is written as a >= x AND (a > x OR b > y), which
+    # PostgreSQL turns into a single range scan on an (a, b) index.
+    (field, descending), value = ordering[0], values[0]
+    lookup = 'lt' if descending else 'gt'
+    after = Q(**{f'{field}__{lookup}': value})
+    if len(ordering) == 1:
+        return after
+    return Q(**{f'{field}__{lookup}e': value}) & (after | _seek_condition(ordering[1:], values[1:]))
+
+
+class KeysetPagination(BasePagination):
+    """Seek-method pagination over a unique ordering, e.g. ('-publication_date', '-id').
+
+    The cursor holds the ordering values of the last row served, so each page
+    is one index range scan no matter how deep it is, and no COUNT(*) runs
+    unless the client asks for one with ?count=exact or ?count=estimated.
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor.'
+
+    def __init__(self, ordering, page_size):
+        self.ordering = [
+            (field.lstrip('-'), field.startswith('-')) for field in ordering
+        ]
+        self.page_size = page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.count = self.get_count(queryset, request)
+        return self.set_page(list(self.seek(queryset, request)[:self.page_size + 1]))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.count = await sync_to_async(self.get_count)(queryset, request)
+        return self.set_page([obj async for obj in self.seek(queryset, request)[:self.page_size + 1]])
+
+    def seek(self, queryset, request):
+        queryset = queryset.order_by(*[
+            f'-{field}' if descending else field for field, descending in self.ordering
+        ])
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            try:
+                queryset = queryset.filter(_seek_condition(self.ordering, cursor))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        return queryset
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'exact':
+            return queryset.count()
+        if mode == 'estimated':
+            return estimate_count(queryset)
+        return None
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+        except (TypeError, ValueError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def encode_cursor(self, instance):
+        values = []
+        for field, _ in self.ordering:
+            # rows may be model instances or .values() dicts
+            value = instance[field] if isinstance(instance, dict) else getattr(instance, field)
+            if isinstance(value, (datetime.date, datetime.datetime)):
+                value = value.isoformat()
+            values.append(value)
+        return base64.urlsafe_b64encode(json.dumps(values).encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        response = {'next': self.get_next_link(), 'previous': None, 'results': data}
+        if self.count is not None:
+            response = {'count': self.count, **response}
+        return Response(response)
+
+
+class CustomPagination(PageNumberPagination):
+    """Page-number pagination, or keyset pagination when the request carries ?cursor=.
+
+    Keyset mode is opt-in per request (start with an empty ?cursor= and follow
+    the next links) and available on views that declare keyset_ordering.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = getattr(view, 'keyset_ordering', None)
+        if ordering and KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination(ordering, self.get_page_size(request))
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views: COUNT and page rows use the async ORM."""
+        ordering = getattr(view, 'keyset_ordering', None)
+        if ordering and KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination(ordering, self.get_page_size(request))
+            return await self.keyset.apaginate_queryset(queryset, request, view)
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        # count is a cached_property; filling it keeps page() from querying
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        self.page.object_list = [obj async for obj in self.page.object_list]
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return list(self.page)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class ChangeFeedPagination(KeysetPagination):
+    """Keyset pagination of the change log in (txid, id) order, resumed with ?since=.
+
+    Unlike a list, a feed is polled past its end, so every response links
+    to where the next poll starts, and ``more`` tells whether it would
+    return entries right away.
+    """
+    cursor_query_param = 'since'
+
+    def __init__(self):
+        super().__init__(('txid', 'id'), CustomPagination.page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = CustomPagination().get_page_size(request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        since = self.encode_cursor(self.page[-1]) if self.page else self.request.query_params.get('since', '')
+        return Response({
+            'next': replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, since),
+            'more': self.has_next,
+            'results': data,
+        })
+
@@ -0,0 +1,142 @@
+"""Optional yearly range partitioning of the comment table on created_at.
+
+``convert()`` swaps articles_comment for a table partitioned by year,
+copying the rows and recreating its indexes, foreign keys and the comment
+counter triggers. The primary key becomes (id, created_at), as PostgreSQL
+requires the partition key in every unique constraint; ids stay unique
+through their sequence. Nothing references comments by foreign key, so
+the models are unchanged. Filters on created_at ranges (the ``year`` and
+``month`` filters of /comments/) then only scan the matching partitions.
+
+The article table cannot be partitioned the same way: comments and the
+author/tag through tables reference article ids, and a foreign key to a
+partitioned table needs the partition key in the referenced columns.
+"""
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Comment
+
+TABLE = Comment._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+
+def partition_name(year):
+    return f'{TABLE}_y{year}'
+
+
+def year_start(year):
+    return timezone.make_aware(datetime(year, 1, 1), timezone.get_default_timezone())
+
+
+def is_partitioned(cursor):
+    cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = %s::regclass", [TABLE])
+    return cursor.fetchone()[0]
+
+
+def partition_years(cursor):
+    """Years of the attached yearly partitions."""
+    cursor.execute(
+        """
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = %s::regclass
+        """,
+        [TABLE]
+    )
+    prefix = partition_name('')
+    return sorted(int(name[len(prefix):]) for name, in cursor.fetchall() if name.startswith(prefix))
+
+
+def create_partition(cursor, year):
+    # the bounds are our own timestamps, so inlining them is safe
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {partition_name(year)} PARTITION OF {TABLE} '
+        f"FOR VALUES FROM ('{year_start(year).isoformat()}') TO ('{year_start(year + 1).isoformat()}')"
+    )
+
+
+def convert(first_year, last_year):
+    """Replace the comment table with one partitioned per year from ``first_year`` to ``last_year``.
+
+    Rows outside those years land in a default partition. Runs in one
+    transaction holding an exclusive lock on the table.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        # deferred foreign key checks would block ALTER TABLE
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute(f'LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE')
+        # definitions name the table, so read them before it is renamed
+        cursor.execute(
+            """
+            SELECT pg_get_indexdef(indexrelid) FROM pg_index
+            WHERE indrelid = %s::regclass AND NOT indisunique
+            """,
+            [TABLE]
+        )
+        indexes = [definition for definition, in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+            [TABLE]
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            'SELECT pg_get_triggerdef(oid) FROM pg_trigger WHERE tgrelid = %s::regclass AND NOT tgisinternal',
+            [TABLE]
+        )
+        triggers = [definition for definition, in cursor.fetchall()]
+
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_unpartitioned')
+        cursor.execute(
+            f'CREATE TABLE {TABLE} (LIKE {TABLE}_unpartitioned INCLUDING DEFAULTS INCLUDING IDENTITY) '
+            'PARTITION BY RANGE (created_at)'
+        )
+        for year in range(first_year, last_year + 1):
+            create_partition(cursor, year)
+        cursor.execute(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT')
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {TABLE}_unpartitioned')
+        cursor.execute(f'DROP TABLE {TABLE}_unpartitioned')
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), coalesce(max(id), 0) + 1, false) FROM {TABLE}"
+        )
+
+        cursor.execute(f'ALTER TABLE {TABLE} ADD PRIMARY KEY (id, created_at)')
+        for definition in indexes + triggers:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}')
+
+
+def ensure_partitions(first_year, last_year):
+    """Create the missing yearly partitions from ``first_year`` to ``last_year``; returns their years."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        existing = set(partition_years(cursor))
+        missing = [year for year in range(first_year, last_year + 1) if year not in existing]
+        for year in missing:
+            create_partition(cursor, year)
+    return missing
+
+
+def detach_before(year):
+    """Detach the partitions of years before ``year`` and return their table names.
+
+    The detached tables stay in the database as archives, without foreign
+    keys so articles and users can still be deleted. Articles keep counting
+    their comments until `manage.py rebuild_article_stats` runs.
+    """
+    detached = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for old_year in partition_years(cursor):
+            if old_year >= year:
+                break
+            name = partition_name(old_year)
+            cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+            cursor.execute(
+                "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'", [name]
+            )
+            for constraint, in cursor.fetchall():
+                cursor.execute(f'ALTER TABLE {name} DROP CONSTRAINT {constraint}')
+            detached.append(name)
+    return detached
@@ -0,0 +1,268 @@
+"""Opt-in per-request profiling.
+
+``ProfilingMiddleware`` is enabled with ``API_PROFILING``. For every request
+it records wall time, database time, the number of queries, queries that
+repeat within the request (usually an N+1) and the time spent producing
+serializer data, labelled with the view and action. The numbers go out as a
+``Server-Timing`` header, one JSON log line on the ``articles.profiling``
+logger and per-process counters served by ``metrics_view`` in the
+Prometheus text format. A sample of requests runs under cProfile and the
+profiles of the slow ones are written to ``API_PROFILING_DIR``.
+
+Streamed responses are measured until their last chunk is sent, so their
+numbers only reach the log and the counters: the header goes out first.
+Under ASGI the queries are caught in the request's sync thread, where the
+async ORM runs them, and cProfile only sees the work done in that thread.
+"""
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, HttpResponse
+
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_profile', default=None)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.label = None
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.queries = Counter()
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries[fingerprint(sql)] += 1
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    def duplicates(self, threshold):
+        return {sql: count for sql, count in self.queries.items() if count >= threshold}
+
+
+def fingerprint(sql):
+    """The query with literals and IN lists collapsed, so repeats compare equal."""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+\b', '?', sql)
+    sql = re.sub(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)', '(...)', sql)
+    return ' '.join(sql.split())
+
+
+@contextmanager
+def timed_serializer():
+    """Adds the time of the block to the current request's serializer time."""
+    profile = _current.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if profile is not None:
+            profile.serializer_time += time.perf_counter() - start
+
+
+def view_label(view_func):
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__name__', 'unknown')
+    return cls.__name__
+
+
+class Metrics:
+    """Request counters and duration histograms of this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def observe(self, labels, wall, db, serializer, queries):
+        with self.lock:
+            entry = self.series.setdefault(labels, {
+                'count': 0, 'wall': 0.0, 'db': 0.0, 'serializer': 0.0, 'queries': 0,
+                'buckets': [0] * len(DURATION_BUCKETS),
+            })
+            entry['count'] += 1
+            entry['wall'] += wall
+            entry['db'] += db
+            entry['serializer'] += serializer
+            entry['queries'] += queries
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if wall <= bound:
+                    entry['buckets'][i] += 1
+
+    def render(self):
+        lines = [
+            '# TYPE api_request_duration_seconds histogram',
+            '# TYPE api_request_db_seconds_total counter',
+            '# TYPE api_request_serializer_seconds_total counter',
+            '# TYPE api_request_queries_total counter',
+        ]
+        with self.lock:
+            for (view, action, method, status), entry in sorted(self.series.items()):
+                labels = f'view="{view}",action="{action}",method="{method}",status="{status}"'
+                for bound, count in zip(DURATION_BUCKETS, entry['buckets']):
+                    lines.append(f'api_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'api_request_duration_seconds_bucket{{{labels},le="+Inf"}} {entry["count"]}')
+                lines.append(f'api_request_duration_seconds_sum{{{labels}}} {entry["wall"]:.6f}')
+                lines.append(f'api_request_duration_seconds_count{{{labels}}} {entry["count"]}')
+                lines.append(f'api_request_db_seconds_total{{{labels}}} {entry["db"]:.6f}')
+                lines.append(f'api_request_serializer_seconds_total{{{labels}}} {entry["serializer"]:.6f}')
+                lines.append(f'api_request_queries_total{{{labels}}} {entry["queries"]}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def metrics_view(request):
+    if not settings.API_PROFILING:
+        raise Http404
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4')
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.API_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile, profiler = RequestProfile(), self.sample_profiler()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            with self.measure(profile, profiler):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, profile, profiler, start)
+
+    async def __acall__(self, request):
+        profile, profiler = RequestProfile(), self.sample_profiler()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        measuring = self.measure(profile, profiler)
+        await sync_to_async(measuring.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(measuring.__exit__)(None, None, None)
+            _current.reset(token)
+        return self.finish(request, response, profile, profiler, start)
+
+    def sample_profiler(self):
+        if random.random() < settings.API_PROFILING_SAMPLE_RATE:
+            return cProfile.Profile()
+        return None
+
+    @contextmanager
+    def measure(self, profile, profiler):
+        """Records the queries of this thread's connections in ``profile`` and runs ``profiler``."""
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile.execute))
+            if profiler is not None:
+                profiler.enable()
+            try:
+                yield
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+
+    def finish(self, request, response, profile, profiler, start):
+        if not response.streaming:
+            wall = time.perf_counter() - start
+            response['Server-Timing'] = ', '.join([
+                f'total;dur={wall * 1000:.1f}',
+                f'db;dur={profile.db_time * 1000:.1f};desc="{profile.query_count} queries"',
+                f'serializer;dur={profile.serializer_time * 1000:.1f}',
+            ])
+            self.report(request, response, profile, wall, profiler)
+        else:
+            measure_stream = self.ameasure_stream if response.is_async else self.measure_stream
+            response.streaming_content = measure_stream(
+                response.streaming_content, request, response, profile, profiler, start
+            )
+        return response
+
+    def measure_stream(self, content, request, response, profile, profiler, start):
+        try:
+            with self.measure(profile, profiler):
+                yield from content
+        finally:
+            self.report(request, response, profile, time.perf_counter() - start, profiler)
+
+    async def ameasure_stream(self, content, request, response, profile, profiler, start):
+        measuring = self.measure(profile, profiler)
+        await sync_to_async(measuring.__enter__)()
+        try:
+            async for chunk in content:
+                yield chunk
+        finally:
+            await sync_to_async(measuring.__exit__)(None, None, None)
+            self.report(request, response, profile, time.perf_counter() - start, profiler)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = _current.get()
+        if profile is not None:
+            actions = getattr(view_func, 'actions', None) or {}
+            profile.label = (view_label(view_func), actions.get(request.method.lower(), ''))
+
+    def report(self, request, response, profile, wall, profiler):
+        view, action = profile.label or ('unresolved', '')
+        duplicates = profile.duplicates(settings.API_PROFILING_DUPLICATE_QUERIES)
+        record = {
+            'view': view,
+            'action': action,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'wall_ms': round(wall * 1000, 2),
+            'db_ms': round(profile.db_time * 1000, 2),
+            'serializer_ms': round(profile.serializer_time * 1000, 2),
+            'queries': profile.query_count,
+            'duplicate_queries': duplicates,
+        }
+        if profiler is not None and wall * 1000 >= settings.API_PROFILING_SLOW_MS:
+            record['profile'] = self.dump_profile(profiler, view, action)
+        logger.log(logging.WARNING if duplicates else logging.INFO, json.dumps(record))
+        metrics.observe(
+            (view, action, request.method, response.status_code),
+            wall, profile.db_time, profile.serializer_time, profile.query_count,
+        )
+
+    def dump_profile(self, profiler, view, action):
+        os.makedirs(settings.API_PROFILING_DIR, exist_ok=True)
+        name = f'{time.strftime("%Y%m%dT%H%M%S")}-{view}-{action or "view"}-{os.getpid()}-{random.randrange(10**6)}.prof'
+        path = os.path.join(settings.API_PROFILING_DIR, name)
+        profiler.dump_stats(path)
+        return path
@@ -1,23 +1,389 @@
-from rest_framework import serializers
-from .models import Author, Tag, Article, Comment
+import importlib.util
+from datetime import MAXYEAR, MINYEAR
 
-class AuthorSerializer(serializers.ModelSerializer):
+from django.contrib.postgres.expressions import ArraySubquery
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import OuterRef, prefetch_related_objects
+from django.db.models.functions import Lower
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import permissions, serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+from .models import Author, Tag, Article, Comment, ExportJob, ChangeLogEntry
+from .profiling import timed_serializer
+from .signals import bulk_saved
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """Writes a list of items with bulk_create/bulk_update.
+
+    Many-to-many values go straight into the through tables with one
+    bulk insert per relation. Items are validated one by one, so errors
+    are reported per item. Updates take ``instance`` as a pk -> object
+    mapping and match each item to its object by ``id``.
+    """
+
+    def run_child_validation(self, data):
+        if self.instance is not None:
+            pk = data.get('id') if isinstance(data, dict) else None
+            instance = self.instance.get(pk)
+            if instance is None:
+                raise serializers.ValidationError({'id': ['No object with this id.']})
+            self.child.instance = instance
+            self.child.initial_data = data
+        return super().run_child_validation(data)
+
+    @property
+    def data(self):
+        with timed_serializer():
+            return super().data
+
+    @property
+    def batch_size(self):
+        return self.context.get('batch_size')
+
+    def m2m_fields(self):
+        return [field for field in self.child.Meta.model._meta.many_to_many if field.name in self.child.fields]
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        relations = [
+            {field.name: attrs.pop(field.name) for field in self.m2m_fields() if field.name in attrs}
+            for attrs in validated_data
+        ]
+        instances = model.objects.bulk_create(
+            [model(**attrs) for attrs in validated_data], batch_size=self.batch_size
+        )
+        self.set_relations(instances, relations)
+        bulk_saved.send(sender=model, instances=instances, created=True)
+        return instances
+
+    def update(self, instance, validated_data):
+        model = self.child.Meta.model
+        instances = [instance[item['id']] for item in self.initial_data]
+        relations = []
+        # bulk_update() leaves auto_now fields alone
+        now = timezone.now()
+        auto_now = [field.name for field in model._meta.concrete_fields if getattr(field, 'auto_now', False)]
+        fields = set(auto_now)
+        for obj, attrs in zip(instances, validated_data):
+            for name in auto_now:
+                setattr(obj, name, now)
+            relations.append({field.name: attrs.pop(field.name) for field in self.m2m_fields() if field.name in attrs})
+            for attr, value in attrs.items():
+                setattr(obj, attr, value)
+                fields.add(attr)
+        if fields:
+            model.objects.bulk_update(instances, fields, batch_size=self.batch_size)
+        self.set_relations(instances, relations, replace=True)
+        bulk_saved.send(sender=model, instances=instances, created=False)
+        return instances
+
+    def set_relations(self, instances, relations, replace=False):
+        for field in self.m2m_fields():
+            through = field.remote_field.through
+            source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+            owners = [(obj, values[field.name]) for obj, values in zip(instances, relations) if field.name in values]
+            if replace and owners:
+                through.objects.filter(**{f'{source}__in': [obj.pk for obj, _ in owners]}).delete()
+            through.objects.bulk_create([
+                through(**{f'{source}_id': obj.pk, f'{target}_id': related.pk})
+                for obj, related_objects in owners
+                for related in dict.fromkeys(related_objects)
+            ], batch_size=self.batch_size)
+            # one query per relation for the response instead of one per item
+            prefetch_related_objects(instances, field.name)
+
+
+def sparse_fieldset(request):
+    """The (fields, expand) name sets of a read request's ?fields= and ?expand=."""
+    if request is None or request.method not in permissions.SAFE_METHODS:
+        return set(), set()
+
+    def names(param):
+        value = request.query_params.get(param, '')
+        return {name.strip() for name in value.split(',') if name.strip()}
+
+    return names('fields'), names('expand')
+
+
+class SparseFieldsMixin:
+    """Lets read requests pick fields with ?fields=a,b and expand with ?expand=c.
+
+    ``expandable_fields`` maps each name to a factory for the field that
+    replaces (or adds to) the default one. Expanded names are always
+    included. The view is expected to load matching querysets.
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields, expand = sparse_fieldset(self.context.get('request'))
+        for name in expand & set(self.expandable_fields):
+            self.fields[name] = self.expandable_fields[name]()
+        if fields:
+            for name in set(self.fields) - fields - expand:
+                self.fields.pop(name)
+
+    @property
+    def data(self):
+        with timed_serializer():
+            return super().data
+
+
+class ValuesSerializer:
+    """Read-only list rendering of a ModelSerializer from .values() rows.
+
+    ``rows()`` turns a queryset into .values() rows holding the columns the
+    serializer's fields read, with the ids of many-to-many fields gathered
+    by an ARRAY subquery in the same query; ``data`` then builds each item
+    without model instances or per-field dispatch. Values whose
+    representation is the stored value are copied as they are, the rest
+    (dates, decimals...) go through their field's to_representation().
+    ``for_serializer()`` returns None for serializers it cannot mirror.
+    """
+    plain_fields = (
+        serializers.CharField, serializers.EmailField, serializers.SlugField, serializers.URLField,
+        serializers.IntegerField, serializers.FloatField, serializers.BooleanField,
+    )
+
+    def __init__(self, columns, instance=None):
+        # [(name, row key, to_representation or None)]
+        self.columns = columns
+        self.instance = instance
+
+    @classmethod
+    def for_serializer(cls, serializer):
+        model = serializer.Meta.model
+        columns = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                return None
+            if isinstance(field, serializers.ManyRelatedField):
+                if not isinstance(field.child_relation, serializers.PrimaryKeyRelatedField) or not model_field.many_to_many:
+                    return None
+                columns.append((name, f'{name}_ids', None))
+            elif isinstance(field, serializers.PrimaryKeyRelatedField):
+                if field.pk_field is not None or not model_field.concrete:
+                    return None
+                columns.append((name, model_field.attname, None))
+            elif not model_field.concrete or model_field.is_relation:
+                return None
+            else:
+                convert = None if type(field) in cls.plain_fields else field.to_representation
+                columns.append((name, model_field.attname, convert))
+        return cls(columns)
+
+    def rows(self, queryset, extra=()):
+        """.values() rows for ``queryset``, with ``extra`` columns (e.g. a keyset ordering) kept too."""
+        model = queryset.model
+        ids = {}
+        keys = set(extra)
+        for name, key, _ in self.columns:
+            if key == f'{name}_ids':
+                field = model._meta.get_field(name)
+                through = field.remote_field.through
+                source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+                ids[key] = ArraySubquery(
+                    through.objects.filter(**{source: OuterRef('pk')}).order_by(f'{target}_id').values(f'{target}_id')
+                )
+            else:
+                keys.add(key)
+        return queryset.prefetch_related(None).values(*sorted(keys), **ids)
+
+    def bind(self, instance):
+        return type(self)(self.columns, instance)
+
+    @property
+    def data(self):
+        with timed_serializer():
+            columns = self.columns
+            return [
+                {
+                    name: row[key] if convert is None or row[key] is None else convert(row[key])
+                    for name, key, convert in columns
+                }
+                for row in self.instance
+            ]
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """A list of primary keys validated with one in_bulk() query rather than one query per key."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        child = self.child_relation
+        queryset = child.get_queryset()
+        pk_field = queryset.model._meta.pk
+        pks = []
+        for item in data:
+            try:
+                pks.append(pk_field.to_python(item))
+            except DjangoValidationError:
+                child.fail('incorrect_type', data_type=type(item).__name__)
+        objects = queryset.in_bulk(pks)
+        for pk in pks:
+            if pk not in objects:
+                child.fail('does_not_exist', pk_value=pk)
+        return [objects[pk] for pk in dict.fromkeys(pks)]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+
+class ManyToManyDiffMixin:
+    """Writes many-to-many fields as a diff of the through table.
+
+    Instead of the per-field set() of ModelSerializer, the rows to remove go
+    in one DELETE and the new ones in one INSERT, next to the instance's
+    own write in one transaction. Current ids come from the instance's
+    prefetched relation when the view loaded one. The written objects are
+    left as the prefetched relation, so the response reads nothing back.
+    The through rows skip m2m_changed; the instance's post_save already
+    invalidates cached responses and logs the change.
+    """
+
+    def create(self, validated_data):
+        relations = self.pop_relations(validated_data)
+        with transaction.atomic():
+            instance = super().create(validated_data)
+            self.write_relations(instance, relations, created=True)
+        return instance
+
+    def update(self, instance, validated_data):
+        relations = self.pop_relations(validated_data)
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            self.write_relations(instance, relations)
+        return instance
+
+    def pop_relations(self, validated_data):
+        return {
+            field.name: validated_data.pop(field.name)
+            for field in self.Meta.model._meta.many_to_many if field.name in validated_data
+        }
+
+    def write_relations(self, instance, relations, created=False):
+        cache = instance.__dict__.setdefault('_prefetched_objects_cache', {})
+        for name, objects in relations.items():
+            field = instance._meta.get_field(name)
+            through = field.remote_field.through
+            source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+            if created:
+                current = set()
+            elif name in cache:
+                current = {obj.pk for obj in cache[name]}
+            else:
+                current = set(through.objects.filter(**{source: instance.pk}).values_list(f'{target}_id', flat=True))
+            wanted = {obj.pk for obj in objects}
+            if current - wanted:
+                through.objects.filter(**{source: instance.pk, f'{target}_id__in': current - wanted}).delete()
+            if wanted - current:
+                # a concurrent write may have added some of them already
+                through.objects.bulk_create([
+                    through(**{f'{source}_id': instance.pk, f'{target}_id': pk}) for pk in wanted - current
+                ], ignore_conflicts=True)
+            cache.pop(name, None)
+            related = getattr(instance, name).all()
+            related._result_cache = list(objects)
+            related._prefetch_done = True
+            cache[name] = related
+
+
+class AuthorSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Author
         fields = '__all__'
+        list_serializer_class = BulkListSerializer
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = '__all__'
+        list_serializer_class = BulkListSerializer
+
+    def validate_name(self, value):
+        tags = Tag.objects.alias(lower_name=Lower('name')).filter(lower_name=value.lower())
+        if self.instance is not None:
+            tags = tags.exclude(pk=self.instance.pk)
+        if tags.exists():
+            raise serializers.ValidationError('A tag with this name already exists.')
+        return value
+
+class ArticleSerializer(ManyToManyDiffMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    serializer_related_field = BulkPrimaryKeyRelatedField
+    expandable_fields = {
+        'authors': lambda: AuthorSerializer(many=True, read_only=True),
+        'tags': lambda: TagSerializer(many=True, read_only=True),
+        'comments_count': lambda: serializers.IntegerField(read_only=True),
+    }
 
-class ArticleSerializer(serializers.ModelSerializer):
     class Meta:
         model = Article 
-        fields = '__all__'
+        exclude = ['search_vector']
+        list_serializer_class = BulkListSerializer
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Comment 
         fields = '__all__'
+        list_serializer_class = BulkListSerializer
+
+
+class ThreadCommentSerializer(CommentSerializer):
+    """A comment as shown under its article, with the commenter's name."""
+    username = serializers.CharField(source='user.username', read_only=True)
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    """An export job; takes the same filters as /articles//download/."""
+    year = serializers.IntegerField(required=False, write_only=True, min_value=MINYEAR, max_value=MAXYEAR - 1)
+    month = serializers.IntegerField(required=False, write_only=True, min_value=1, max_value=12)
+    authors = serializers.ListField(child=serializers.CharField(), required=False, write_only=True)
+    tags = serializers.ListField(child=serializers.CharField(), required=False, write_only=True)
+    authors_match = serializers.ChoiceField(['any', 'all'], required=False, write_only=True)
+    tags_match = serializers.ChoiceField(['any', 'all'], required=False, write_only=True)
+    keywords = serializers.CharField(required=False, write_only=True)
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = [
+            'id', 'format', 'params', 'status', 'rows', 'error', 'created_at', 'started_at', 'finished_at',
+            'download_url', 'year', 'month', 'authors', 'tags', 'authors_match', 'tags_match', 'keywords',
+        ]
+        read_only_fields = ['params', 'status', 'rows', 'error', 'started_at', 'finished_at']
+
+    def validate_format(self, value):
+        if value == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+            raise serializers.ValidationError('Parquet exports need pyarrow installed.')
+        return value
+
+    def get_download_url(self, job):
+        if job.status != ExportJob.DONE:
+            return None
+        url = reverse('export-download', args=[job.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class ChangeLogEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ChangeLogEntry
+        fields = ['model', 'object_id', 'action', 'changed_at']
 
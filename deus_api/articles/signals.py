@@ -0,0 +1,116 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.functions import Now
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import forget_token, forget_user
+from .cache import bump_version_on_commit
+from .models import Author, Tag, Article, Comment, ChangeLogEntry
+
+
+# Sent after bulk_create/bulk_update writes, which send no post_save (and
+# no m2m_changed for their through rows). Arguments: instances, created.
+bulk_saved = Signal()
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(bulk_saved)
+def invalidate_model_cache(sender, **kwargs):
+    bump_version_on_commit(sender)
+
+
+@receiver(m2m_changed, sender=Article.authors.through)
+@receiver(m2m_changed, sender=Article.tags.through)
+def invalidate_article_relations_cache(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump_version_on_commit(Article)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_usernames_cache(sender, update_fields=None, **kwargs):
+    # comment threads show the commenter's username
+    if update_fields is None or 'username' in update_fields:
+        bump_version_on_commit(Comment)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_cached_user(sender, instance, **kwargs):
+    # after the commit, or a concurrent request could cache the old row again
+    transaction.on_commit(partial(forget_user, instance.pk))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    transaction.on_commit(partial(forget_token, instance.key))
+
+
+# Change log for the /changes/ feed. A comment write also changes its
+# article's comment_count/last_commented_at, so it logs an article update.
+
+def log_article_updates(article_ids, touch=False):
+    article_ids = sorted(set(article_ids))
+    if not article_ids:
+        return
+    if touch:
+        Article.objects.filter(pk__in=article_ids).update(updated_at=Now())
+    ChangeLogEntry.objects.record(Article, article_ids, ChangeLogEntry.UPDATE)
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_save, sender=Comment)
+def log_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    ChangeLogEntry.objects.record(sender, [instance.pk], ChangeLogEntry.CREATE if created else ChangeLogEntry.UPDATE)
+    if sender is Comment and created:
+        log_article_updates([instance.article_id])
+
+
+@receiver(bulk_saved, sender=Article)
+@receiver(bulk_saved, sender=Comment)
+def log_bulk_saved(sender, instances, created, **kwargs):
+    action = ChangeLogEntry.CREATE if created else ChangeLogEntry.UPDATE
+    ChangeLogEntry.objects.record(sender, [instance.pk for instance in instances], action)
+    if sender is Comment and created:
+        log_article_updates(instance.article_id for instance in instances)
+
+
+@receiver(post_delete, sender=Article)
+@receiver(post_delete, sender=Comment)
+def log_deleted(sender, instance, **kwargs):
+    ChangeLogEntry.objects.record(sender, [instance.pk], ChangeLogEntry.DELETE)
+    if sender is Comment:
+        log_article_updates([instance.article_id])
+
+
+@receiver(m2m_changed, sender=Article.authors.through)
+@receiver(m2m_changed, sender=Article.tags.through)
+def log_article_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            log_article_updates([instance.pk], touch=True)
+    elif action in ('post_add', 'post_remove'):
+        log_article_updates(pk_set, touch=True)
+    elif action == 'pre_clear':
+        # the cleared articles cannot be told apart afterwards
+        log_article_updates(instance.articles.values_list('pk', flat=True), touch=True)
+
+
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Tag)
+def log_related_deleted(sender, instance, **kwargs):
+    # the through rows go without m2m_changed
+    log_article_updates(instance.articles.values_list('pk', flat=True), touch=True)
+
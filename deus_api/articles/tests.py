@@ -1,14 +1,87 @@
-from django.test import TestCase
+import csv
+import importlib.util
+import json
+import os
+from datetime import timedelta
+from io import BytesIO, StringIO
+from tempfile import TemporaryDirectory
+from unittest import skipUnless
+from unittest.mock import patch
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import AsyncClient, AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
-from .models import Author, Article, Tag, Comment
+from django.utils import timezone
+from .authentication import CachedJWTAuthentication, CachedTokenAuthentication, cached_user, user_cache_key
+from .benchmarks import compare, run_benchmarks
+from .cache import bump_version, get_cache, get_versions
+from .db_routing import PIN_COOKIE, PrimaryAfterWriteMixin, ReplicaRouter, ReplicaRoutingMiddleware, pin_key
+from .models import Author, Article, Tag, Comment, ExportJob, ChangeLogEntry
+from .name_cache import clear_name_caches
+from . import partitioning
+from .pagination import CustomPagination
+from .profiling import ProfilingMiddleware, RequestProfile, fingerprint
+from .throttling import refill_and_spend
+from .filters import ArticleFilter, CommentFilter
+from .views import ArticleExport, ArticleViewSet, CommentViewSet
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
 import logging
 from rest_framework.authtoken.models import Token
 
 
 
-class ArticleCommentTestCase(TestCase):
+# A private in-process cache, whatever REDIS_URL the environment sets.
+# API_PROFILING is off as well, or every request would log a JSON line;
+# ProfilingMiddlewareTestCase turns it back on.
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'articles-tests'}}
+
+
+def reset_caches():
+    # test transactions never commit, so no write bumps a version and the
+    # responses and maps cached by one test would otherwise be served to
+    # the next
+    get_cache().clear()
+    clear_name_caches()
+
+
+@override_settings(CACHES=TEST_CACHES, API_CACHE_ALIAS='default', API_PROFILING=False)
+class ApiTestCase(TestCase):
+    def setUp(self):
+        reset_caches()
+
+
+class AuthenticatedTestCase(ApiTestCase):
+    """George, signed in through a DRF token on ``self.client``."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='George', email='george@example2.com', password='george123')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def create_article(self, title='Article', authors=(), tags=(), **fields):
+        fields = {'abstract': 'Abstract', 'publication_date': '2023-05-03', **fields}
+        article = Article.objects.create(title=title, user=self.user, **fields)
+        if authors:
+            article.authors.set(authors)
+        if tags:
+            article.tags.set(tags)
+        return article
+
+
+class ArticleCommentTestCase(ApiTestCase):
     def setUp(self):
+        super().setUp()
         self.user1 = User.objects.create_user(username='George', email='george@example2.com', password='george123')
         self.user2 = User.objects.create_user(username='John', email='john@example1.com', password='john123')
 
@@ -123,4 +196,1497 @@ class ArticleCommentTestCase(TestCase):
         # Attempt to delete the article owned by user1
         #response = self.client.delete(f'/articles/{self.article1.id}/')
 
-        # Check that the request was forbidden (403)
\ No newline at end of file
+        # Check that the request was forbidden (403)
+
+
+class ArticleQueryCountTestCase(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        authors = [Author.objects.create(name=f'Author {i}', email=f'author{i}@example.com') for i in range(3)]
+        tags = [Tag.objects.create(name=f'Tag {i}') for i in range(3)]
+        for i in range(20):
+            self.create_article(f'Article {i}', authors=authors, tags=tags)
+
+    def test_list_query_count_is_independent_of_page_size(self):
+        # token lookup, count, page, authors prefetch, tags prefetch
+        for page_size in (1, 5, 20):
+            with self.subTest(page_size=page_size), self.assertNumQueries(5):
+                response = self.client.get(f'/articles/?page_size={page_size}')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data.get('results')), page_size)
+            self.assertEqual(len(response.data.get('results')[0].get('tags')), 3)
+
+    def test_retrieve_query_count(self):
+        article = Article.objects.first()
+        # token lookup, article, authors prefetch, tags prefetch
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/articles/{article.id}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_export_query_count(self):
+        # token lookup, articles, authors prefetch, tags prefetch
+        with self.assertNumQueries(4):
+            response = self.client.get('/articles//download/')
+            content = b''.join(response.streaming_content).decode()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(content.strip().splitlines()), 21)
+
+    @override_settings(ARTICLE_EXPORT_CHUNK_SIZE=8)
+    def test_export_streams_in_chunks(self):
+        # token lookup, articles, then authors and tags prefetch for each of the 3 chunks
+        with self.assertNumQueries(8):
+            response = self.client.get('/articles//download/')
+            self.assertTrue(response.streaming)
+            rows = list(csv.reader(
+                line.decode() for line in response.streaming_content
+            ))
+        self.assertEqual(rows[0], ['Title', 'Abstract', 'Publication Date', 'Authors', 'Tags'])
+        self.assertEqual(len(rows), 21)
+        self.assertEqual(sorted(rows[1][3].split(', ')), ['Author 0', 'Author 1', 'Author 2'])
+
+    def test_export_is_streamed_csv(self):
+        response = self.client.get('/articles//download/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+
+
+class ArticleSearchTestCase(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.article1 = self.create_article(
+            'Scaling PostgreSQL', abstract='Notes on indexing and partitioning databases'
+        )
+        self.article2 = self.create_article(
+            'Django performance', abstract='Why PostgreSQL indexes matter for ORM queries', publication_date='2022-01-10'
+        )
+
+    def test_search_matches_stemmed_words(self):
+        response = self.client.get('/articles/?keywords=indexes')
+        self.assertEqual(response.data.get('count'), 2)
+        response = self.client.get('/articles/?keywords=partitioned')
+        self.assertEqual(response.data.get('count'), 1)
+        self.assertEqual(response.data.get('results')[0].get('title'), 'Scaling PostgreSQL')
+
+    def test_search_ranks_title_matches_first(self):
+        response = self.client.get('/articles/?keywords=postgresql')
+        titles = [article.get('title') for article in response.data.get('results')]
+        self.assertEqual(titles, ['Scaling PostgreSQL', 'Django performance'])
+
+    def test_explicit_ordering_overrides_rank(self):
+        response = self.client.get('/articles/?keywords=postgresql&ordering=publication_date')
+        titles = [article.get('title') for article in response.data.get('results')]
+        self.assertEqual(titles, ['Django performance', 'Scaling PostgreSQL'])
+
+    def test_search_vector_follows_updates(self):
+        self.article2.abstract = 'Caching strategies'
+        self.article2.save()
+        self.assertEqual(Article.objects.search('postgresql').count(), 1)
+
+    def test_export_uses_search(self):
+        response = self.client.get('/articles//download/?keywords=partitioning')
+        rows = list(csv.reader(line.decode() for line in response.streaming_content))
+        self.assertEqual([row[0] for row in rows[1:]], ['Scaling PostgreSQL'])
+
+
+class KeysetPaginationTestCase(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(20):
+            # several articles share a date so the id tie-breaker matters
+            article = self.create_article(f'Article {i}', publication_date=f'2023-05-{i // 3 + 1:02d}')
+            Comment.objects.create(article=article, user=self.user, text=f'Comment {i}')
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item.get('id') for item in response.data.get('results'))
+            url = response.data.get('next')
+        return ids
+
+    def test_walks_articles_in_keyset_order(self):
+        ids = self.walk('/articles/?cursor=&page_size=7')
+        expected = list(Article.objects.order_by('-publication_date', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_walks_comments_in_keyset_order(self):
+        ids = self.walk('/comments/?cursor=&page_size=6')
+        expected = list(Comment.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_keyset_skips_count_query(self):
+        # token lookup, page, authors prefetch, tags prefetch
+        with self.assertNumQueries(4):
+            response = self.client.get('/articles/?cursor=&page_size=5')
+        self.assertNotIn('count', response.data)
+
+    def test_keyset_count_modes(self):
+        response = self.client.get('/articles/?cursor=&count=exact&year=2023')
+        self.assertEqual(response.data.get('count'), 20)
+        response = self.client.get('/articles/?cursor=&count=estimated')
+        self.assertIsInstance(response.data.get('count'), int)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/articles/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+    @patch.object(CustomPagination, 'max_page_size', 3)
+    def test_page_size_is_capped(self):
+        response = self.client.get('/articles/?page_size=1000000')
+        self.assertEqual(len(response.data.get('results')), 3)
+        response = self.client.get('/articles/?cursor=&page_size=1000000')
+        self.assertEqual(len(response.data.get('results')), 3)
+
+
+class ArticleFilterIndexTestCase(AuthenticatedTestCase):
+    """Every ArticleFilter access path must be answerable from an index."""
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            author = Author.objects.create(name='Author George', email='georgeauthor@example.com')
+            tag = Tag.objects.create(name='Python')
+            self.create_article(
+                'Article Python', authors=[author], tags=[tag], abstract='This is the first article'
+            )
+
+    def assertNoSeqScan(self, data):
+        queryset = ArticleFilter(data, queryset=Article.objects.all()).qs
+        with connection.cursor() as cursor:
+            # the tables are tiny; make the planner pick indexes when it can
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan, msg=f'{data}:\n{plan}')
+        return queryset
+
+    def test_year(self):
+        self.assertEqual(self.assertNoSeqScan({'year': '2023'}).count(), 1)
+
+    def test_month(self):
+        self.assertEqual(self.assertNoSeqScan({'month': '5'}).count(), 1)
+
+    def test_year_and_month(self):
+        self.assertEqual(self.assertNoSeqScan({'year': '2023', 'month': '5'}).count(), 1)
+        self.assertEqual(self.assertNoSeqScan({'year': '2023', 'month': '12'}).count(), 0)
+
+    def test_keywords(self):
+        self.assertEqual(self.assertNoSeqScan({'keywords': 'first'}).count(), 1)
+
+    def test_authors(self):
+        self.assertEqual(self.assertNoSeqScan({'authors': 'author george'}).count(), 1)
+
+    def test_tags(self):
+        self.assertEqual(self.assertNoSeqScan({'tags': 'python'}).count(), 1)
+        self.assertEqual(self.assertNoSeqScan({'tags': 'python,java', 'tags_match': 'all'}).count(), 0)
+
+    def test_out_of_range_dates(self):
+        self.assertEqual(ArticleFilter({'month': '13'}, queryset=Article.objects.all()).qs.count(), 0)
+        self.assertEqual(ArticleFilter({'year': '99999'}, queryset=Article.objects.all()).qs.count(), 0)
+
+
+class ResponseCacheTestCase(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tag = Tag.objects.create(name='Python')
+        self.article = self.create_article('Article Python', tags=[self.tag], abstract='This is the first article')
+
+    def test_repeated_list_is_served_from_cache(self):
+        response = self.client.get('/articles/?year=2023')
+        self.assertEqual(response.data.get('count'), 1)
+        # only the token lookup
+        with self.assertNumQueries(1):
+            cached = self.client.get('/articles/?year=2023')
+        self.assertEqual(cached.data, response.data)
+        self.assertEqual(cached['ETag'], response['ETag'])
+
+    def test_if_none_match_returns_304(self):
+        response = self.client.get(f'/tags/{self.tag.id}/')
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(f'/tags/{self.tag.id}/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_writes_invalidate(self):
+        etag = self.client.get('/articles/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.article.tags.add(Tag.objects.create(name='Java'))
+        response = self.client.get('/articles/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data.get('results')[0].get('tags')), 2)
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tag.delete()
+        response = self.client.get('/articles/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data.get('results')[0].get('tags')), 1)
+
+    def test_versions_change_once_the_write_commits(self):
+        before = get_versions([Tag, Article])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.article.tags.add(Tag.objects.create(name='Go'))
+            self.assertEqual(get_versions([Tag, Article]), before)
+        after = get_versions([Tag, Article])
+        self.assertTrue(all(new != old for new, old in zip(after, before)))
+
+    def test_query_params_are_part_of_the_key(self):
+        self.assertEqual(self.client.get('/articles/?year=2023').data.get('count'), 1)
+        self.assertEqual(self.client.get('/articles/?year=2020').data.get('count'), 0)
+
+    @override_settings(API_CACHE_TIMEOUT=0)
+    def test_cache_can_be_disabled(self):
+        self.client.get('/articles/')
+        with self.assertNumQueries(5):
+            response = self.client.get('/articles/')
+        self.assertNotIn('ETag', response)
+
+
+class BulkEndpointTestCase(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user2 = User.objects.create_user(username='John', email='john@example1.com', password='john123')
+        self.author = Author.objects.create(name='Author George', email='georgeauthor@example.com')
+        self.tags = [Tag.objects.create(name=f'Tag {i}') for i in range(3)]
+
+    def article_payload(self, i):
+        return {
+            'title': f'Article {i}',
+            'abstract': 'Abstract',
+            'publication_date': '2023-05-03',
+            'authors': [self.author.id],
+            'tags': [tag.id for tag in self.tags],
+        }
+
+    def test_bulk_create_articles(self):
+        payload = [self.article_payload(i) for i in range(10)]
+        response = self.client.post('/articles/bulk/?batch_size=4', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 10)
+        self.assertEqual(response.data[0].get('user'), self.user.id)
+        self.assertEqual(len(response.data[0].get('tags')), 3)
+        self.assertEqual(Article.objects.count(), 10)
+        self.assertEqual(Article.tags.through.objects.count(), 30)
+
+    def test_bulk_create_reports_item_errors_and_writes_nothing(self):
+        payload = [self.article_payload(0), {'title': 'Missing fields'}, self.article_payload(2)]
+        response = self.client.post('/articles/bulk/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error.get('index') for error in response.data.get('errors')], [1])
+        self.assertIn('abstract', response.data.get('errors')[0].get('errors'))
+        self.assertEqual(Article.objects.count(), 0)
+
+    def test_bulk_create_tags_and_comments(self):
+        response = self.client.post('/tags/bulk/', [{'name': 'Go'}, {'name': 'Rust'}], format='json')
+        self.assertEqual(response.status_code, 201)
+        article = Article.objects.create(title='A', abstract='B', publication_date='2023-05-03', user=self.user2)
+        response = self.client.post('/comments/bulk/', [{'article': article.id, 'text': 'Hi'}] * 3, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(set(Comment.objects.values_list('user', flat=True)), {self.user.id})
+
+    def test_bulk_update_articles(self):
+        created = self.client.post('/articles/bulk/', [self.article_payload(i) for i in range(3)], format='json').data
+        payload = [{'id': article.get('id'), 'title': 'Renamed', 'tags': [self.tags[0].id]} for article in created]
+        response = self.client.patch('/articles/bulk/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(Article.objects.values_list('title', flat=True)), {'Renamed'})
+        self.assertEqual(Article.tags.through.objects.count(), 3)
+        self.assertEqual(response.data[0].get('tags'), [self.tags[0].id])
+
+    def test_bulk_update_checks_ownership(self):
+        own = Article.objects.create(title='Own', abstract='B', publication_date='2023-05-03', user=self.user)
+        other = Article.objects.create(title='Other', abstract='B', publication_date='2023-05-03', user=self.user2)
+        payload = [{'id': own.id, 'title': 'X'}, {'id': other.id, 'title': 'X'}]
+        response = self.client.patch('/articles/bulk/', payload, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual([error.get('index') for error in response.data.get('errors')], [1])
+        own.refresh_from_db()
+        self.assertEqual(own.title, 'Own')
+
+    def test_bulk_delete(self):
+        own = [
+            Article.objects.create(title='Own', abstract='B', publication_date='2023-05-03', user=self.user)
+            for _ in range(2)
+        ]
+        other = Article.objects.create(title='Other', abstract='B', publication_date='2023-05-03', user=self.user2)
+        response = self.client.delete('/articles/bulk/', [own[0].id, other.id, 0], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error.get('index') for error in response.data.get('errors')], [1, 2])
+        self.assertEqual(Article.objects.count(), 3)
+        response = self.client.delete('/articles/bulk/', [article.id for article in own], format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(list(Article.objects.values_list('id', flat=True)), [other.id])
+
+    def test_bulk_rejects_malformed_ids(self):
+        tag = Tag.objects.first()
+        response = self.client.delete('/tags/bulk/', [tag.id, {'id': tag.id}, [tag.id], 'x', None], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2, 3, 4])
+
+        payload = [{'id': [tag.id], 'name': 'A'}, {'id': {'id': tag.id}, 'name': 'B'}, {'name': 'C'}, 'x']
+        response = self.client.patch('/tags/bulk/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.data['errors']], [0, 1, 2, 3])
+        self.assertEqual(Tag.objects.count(), 3)
+
+        response = self.client.patch('/tags/bulk/', [{'id': str(tag.id), 'name': 'Renamed'}], format='json')
+        self.assertEqual(response.status_code, 200)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Renamed')
+
+    def test_bulk_write_invalidates_cache(self):
+        self.assertEqual(self.client.get('/tags/').data.get('count'), 3)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post('/tags/bulk/', [{'name': 'Go'}], format='json')
+            self.assertEqual(self.client.get('/tags/').data.get('count'), 3)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.client.get('/tags/').data.get('count'), 4)
+
+    def test_bulk_requires_authentication(self):
+        response = APIClient().post('/tags/bulk/', [{'name': 'Go'}], format='json')
+        self.assertIn(response.status_code, [401, 403])
+
+    @override_settings(API_BULK_MAX_ITEMS=2)
+    def test_bulk_item_limit(self):
+        response = self.client.post('/tags/bulk/', [{'name': 'Go'}] * 3, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class PopulateFakeDataTestCase(ApiTestCase):
+    def populate(self, **options):
+        call_command('populate_fake_data', stdout=StringIO(), **options)
+
+    def test_creates_requested_rows(self):
+        self.populate(articles=25, comments=40, authors=3, tags=4, users=2, batch_size=10, seed=1)
+        self.assertEqual(Article.objects.count(), 25)
+        self.assertEqual(Comment.objects.count(), 40)
+        self.assertEqual(Author.objects.count(), 3)
+        self.assertEqual(Tag.objects.count(), 4)
+        self.assertEqual(User.objects.count(), 3)
+        self.assertEqual(Article.authors.through.objects.count(), 25)
+        self.assertFalse(Article.objects.filter(tags=None).exists())
+        self.assertTrue(User.objects.get(username='george').check_password('123'))
+
+    def test_copy_mode(self):
+        self.populate(articles=12, comments=30, batch_size=5, seed=3, copy=True)
+        self.assertEqual(Article.objects.count(), 12)
+        self.assertEqual(Comment.objects.count(), 30)
+        self.assertEqual(Article.authors.through.objects.count(), 12)
+        # the generated search column is filled for copied rows too
+        title = Article.objects.first().title
+        self.assertTrue(Article.objects.search(title).exists())
+
+    def test_seed_is_deterministic(self):
+        self.populate(articles=5, comments=5, seed=7, batch_size=2)
+        first = list(Article.objects.order_by('id').values_list('title', 'abstract'))
+        Article.objects.all().delete()
+        self.populate(articles=5, comments=5, seed=7, batch_size=2)
+        second = list(Article.objects.order_by('id').values_list('title', 'abstract'))
+        self.assertEqual(first, second)
+
+    def test_empty_pools_fail_early(self):
+        for pool in ('authors', 'tags'):
+            with self.assertRaisesMessage(CommandError, f'--{pool} must be at least 1'):
+                self.populate(articles=5, **{pool: 0})
+        self.assertFalse(Tag.objects.exists() or Author.objects.exists())
+        # george owns the rows when no users are created
+        self.populate(articles=3, comments=3, users=0, seed=2)
+        self.assertEqual(set(Article.objects.values_list('user__username', flat=True)), {'george'})
+
+    def test_comments_are_spread_after_their_article(self):
+        for copy in (False, True):
+            Article.objects.all().delete()
+            inserted = timezone.now()
+            self.populate(articles=10, comments=30, seed=5, copy=copy)
+            comments = Comment.objects.values_list('created_at', 'article__publication_date')
+            days = {timezone.localtime(created_at).date() for created_at, _ in comments}
+            self.assertGreater(len(days), 5)
+            for created_at, published in comments:
+                self.assertGreaterEqual(timezone.localtime(created_at).date(), published)
+                self.assertLess(created_at, inserted)
+
+
+class SparseFieldsetTestCase(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        authors = [Author.objects.create(name=f'Author {i}', email=f'author{i}@example.com') for i in range(2)]
+        tags = [Tag.objects.create(name=f'Tag {i}') for i in range(3)]
+        for i in range(10):
+            article = self.create_article(f'Article {i}', authors=authors, tags=tags)
+            for _ in range(i):
+                Comment.objects.create(article=article, user=self.user, text='Comment')
+
+    def test_fields_limits_representation_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/articles/?fields=id,title')
+        self.assertEqual(set(response.data.get('results')[0]), {'id', 'title'})
+        # token lookup, count, page; no relation prefetches
+        self.assertEqual(len(queries), 3)
+        self.assertNotIn('abstract', queries[-1]['sql'])
+
+    def test_expand_relations_and_counts(self):
+        # token lookup, count, page (with the count subquery), authors, tags
+        with self.assertNumQueries(5):
+            response = self.client.get('/articles/?expand=authors,tags,comments_count&ordering=id')
+        results = response.data.get('results')
+        self.assertEqual(sorted(author.get('name') for author in results[0].get('authors')), ['Author 0', 'Author 1'])
+        self.assertEqual(len(results[0].get('tags')), 3)
+        self.assertEqual([article.get('comments_count') for article in results], list(range(10)))
+
+    def test_fields_and_expand_together(self):
+        response = self.client.get('/articles/?fields=title&expand=tags')
+        article = response.data.get('results')[0]
+        self.assertEqual(set(article), {'title', 'tags'})
+        self.assertIn('name', article.get('tags')[0])
+
+    def test_retrieve_and_other_serializers(self):
+        article = Article.objects.first()
+        response = self.client.get(f'/articles/{article.id}/?expand=comments_count&fields=id')
+        self.assertEqual(response.data, {'id': article.id, 'comments_count': article.comments.count()})
+        response = self.client.get('/comments/?fields=text')
+        self.assertEqual(set(response.data.get('results')[0]), {'text'})
+
+    def test_writes_ignore_fields(self):
+        article = Article.objects.first()
+        response = self.client.patch(f'/articles/{article.id}/?fields=title', {'abstract': 'Changed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('abstract', response.data)
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class BenchmarkTestCase(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        call_command('populate_fake_data', articles=30, comments=30, seed=3, stdout=StringIO())
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(username='george'))
+
+    def test_run_benchmarks_reports_every_endpoint(self):
+        results = run_benchmarks(self.client, iterations=2)
+        self.assertEqual(results['export']['rows'], 30)
+        self.assertEqual(results['articles_fields']['queries'], 2)
+        # page, authors, tags against one query with the ids aggregated
+        self.assertEqual(results['serialize_model_json']['queries'], 3)
+        if 'serialize_values_orjson' in results:
+            self.assertEqual(results['serialize_values_orjson']['queries'], 1)
+        for name, result in results.items():
+            if not name.startswith('export'):
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+    def test_compare_flags_regressions(self):
+        baseline = {
+            'articles_list': {'p95_ms': 10.0, 'queries': 4},
+            'export': {'rows_per_second': 1000.0},
+        }
+        within = {'articles_list': {'p95_ms': 18.0, 'queries': 4}, 'export': {'rows_per_second': 600.0}}
+        self.assertEqual(compare(within, baseline), [])
+        slower = {'articles_list': {'p95_ms': 30.0, 'queries': 5}, 'export': {'rows_per_second': 100.0}}
+        self.assertEqual(len(compare(slower, baseline)), 3)
+
+
+@override_settings(API_PROFILING=True, API_CACHE_TIMEOUT=0)
+class ProfilingMiddlewareTestCase(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='profiled', password='pass')
+        Article.objects.create(title='Profiled', abstract='Abstract', publication_date='2023-01-01', user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_server_timing_log_and_metrics(self):
+        with self.assertLogs('articles.profiling', level='INFO') as logs:
+            response = self.client.get('/articles/')
+        timing = response['Server-Timing']
+        self.assertIn('total;dur=', timing)
+        self.assertIn('db;dur=', timing)
+        self.assertIn('serializer;dur=', timing)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record['view'], record['action'], record['status']), ('ArticleViewSet', 'list', 200))
+        # count, page, authors, tags
+        self.assertEqual(record['queries'], 4)
+
+        metrics = self.client.get('/metrics/').content.decode()
+        self.assertIn('api_request_duration_seconds_count{view="ArticleViewSet",action="list",method="GET",status="200"}', metrics)
+
+    def test_duplicate_queries_are_fingerprinted(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM "a" WHERE "a"."id" = 12 AND "a"."name" IN (%s, %s)'),
+            fingerprint('SELECT * FROM "a" WHERE "a"."id" = 7 AND "a"."name" IN (%s)'),
+        )
+        profile = RequestProfile()
+        for pk in range(5):
+            profile.execute(lambda *args: None, f'SELECT 1 FROM "a" WHERE id = {pk}', None, False, {})
+        self.assertEqual(profile.duplicates(5), {'SELECT ? FROM "a" WHERE id = ?': 5})
+
+    def test_slow_requests_are_profiled(self):
+        with TemporaryDirectory() as directory, \
+                override_settings(API_PROFILING_SAMPLE_RATE=1, API_PROFILING_SLOW_MS=0, API_PROFILING_DIR=directory):
+            with self.assertLogs('articles.profiling', level='INFO'):
+                self.client.get('/articles/')
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_streamed_responses_are_measured_to_the_end(self):
+        with self.assertLogs('articles.profiling', level='INFO') as logs:
+            response = self.client.get('/articles//download/')
+            self.assertNotIn('Server-Timing', response)
+            self.assertEqual(logs.records, [])
+            b''.join(response.streaming_content)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record['view'], record['action']), ('ArticleExport', 'list'))
+        # articles, authors, tags
+        self.assertEqual(record['queries'], 3)
+
+    async def test_async_requests(self):
+        token = await Token.objects.acreate(user=self.user)
+        self.assertTrue(iscoroutinefunction(ProfilingMiddleware(self.async_get_response)))
+        with self.assertLogs('articles.profiling', level='INFO') as logs:
+            response = await AsyncClient().get('/articles/', headers={'authorization': f'Token {token.key}'})
+        self.assertIn('db;dur=', response['Server-Timing'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record['view'], record['action'], record['status']), ('ArticleViewSet', 'list', 200))
+        # token lookup, count, page, authors, tags
+        self.assertEqual(record['queries'], 5)
+
+    async def async_get_response(self, request):
+        return None
+
+    @override_settings(API_PROFILING=False)
+    def test_disabled_by_default(self):
+        response = APIClient().get('/tags/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(self.client.get('/metrics/').status_code, 404)
+
+
+@override_settings(API_ASYNC_VIEWS=True, API_CACHE_TIMEOUT=0)
+class AsyncViewTestCase(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='async', password='pass')
+        self.token = Token.objects.create(user=self.user)
+        self.author = author = Author.objects.create(name='Async Author', email='async@example.com')
+        self.tag = tag = Tag.objects.create(name='async')
+        for i in range(3):
+            article = Article.objects.create(
+                title=f'Async {i}', abstract='Abstract', publication_date=f'2023-0{i + 1}-01', user=self.user
+            )
+            article.authors.add(author)
+            article.tags.add(tag)
+            Comment.objects.create(article=article, user=self.user, text='Comment')
+        self.headers = {'authorization': f'Token {self.token.key}'}
+
+    async def get(self, viewset, action, path, **kwargs):
+        view = viewset.as_view({'get': action})
+        self.assertTrue(iscoroutinefunction(view))
+        return await view(AsyncRequestFactory().get(path, headers=self.headers), **kwargs)
+
+    def test_list_matches_sync_view(self):
+        # token lookup, count, page, authors, tags
+        with self.assertNumQueries(5):
+            response = async_to_sync(self.get)(ArticleViewSet, 'list', '/articles/?year=2023&ordering=id')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, self.sync_get('/articles/?year=2023&ordering=id').data)
+
+    def sync_get(self, path):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client.get(path)
+
+    async def test_keyset_and_retrieve(self):
+        response = await self.get(CommentViewSet, 'list', '/comments/?cursor=&page_size=2')
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+
+        article = await Article.objects.afirst()
+        response = await self.get(ArticleViewSet, 'retrieve', f'/articles/{article.id}/', pk=article.id)
+        self.assertEqual(response.data['title'], article.title)
+        response = await self.get(ArticleViewSet, 'retrieve', '/articles/0/', pk=0)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_requires_authentication(self):
+        view = ArticleViewSet.as_view({'get': 'list'})
+        response = await view(AsyncRequestFactory().get('/articles/'))
+        self.assertEqual(response.status_code, 401)
+
+    async def test_streaming_export(self):
+        response = await self.get(ArticleExport, 'list', '/articles//download/')
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][3], 'Async Author')
+
+    async def test_streaming_jsonl_export(self):
+        response = await self.get(ArticleExport, 'list', '/articles//download/?format=jsonl')
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0]['authors'], ['Async Author'])
+
+    async def test_export_rejects_invalid_filters(self):
+        response = await self.get(ArticleExport, 'list', '/articles//download/?month=13')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('month', response.data)
+
+    async def test_name_filters_reload_in_a_thread(self):
+        # a stale version makes the name maps reload from the database
+        await sync_to_async(bump_version)(Author)
+        await sync_to_async(bump_version)(Tag)
+        response = await self.get(ArticleViewSet, 'list', '/articles/?authors=async%20author')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+
+        await sync_to_async(bump_version)(Tag)
+        response = await self.get(ArticleExport, 'list', '/articles//download/?format=jsonl&tags=async')
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(len(content.splitlines()), 3)
+
+    def test_other_actions_stay_sync(self):
+        view = ArticleViewSet.as_view({'get': 'list', 'post': 'create'})
+        request = RequestFactory().post(
+            '/articles/', {'title': 'New', 'abstract': 'A', 'publication_date': '2023-05-01',
+             'user': self.user.id, 'authors': [self.author.id], 'tags': [self.tag.id]},
+            content_type='application/json', headers=self.headers
+        )
+        response = async_to_sync(view)(request)
+        self.assertEqual(response.status_code, 201)
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class AuthenticationModeTestCase(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username='owner', password='pass')
+        self.other = User.objects.create_user(username='other', password='pass')
+        self.article = Article.objects.create(
+            title='Owned', abstract='Abstract', publication_date='2023-01-01', user=self.owner
+        )
+        self.jwt = str(AccessToken.for_user(self.owner))
+        self.token = Token.objects.create(user=self.owner)
+
+    def client_for(self, header):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=header)
+        return client
+
+    def test_db_mode_loads_the_user_every_time(self):
+        client = self.client_for(f'Bearer {self.jwt}')
+        for _ in range(2):
+            # user, count, page, authors, tags
+            with self.assertNumQueries(5):
+                self.assertEqual(client.get('/articles/').status_code, 200)
+
+    @patch.object(APIView, 'authentication_classes', [CachedJWTAuthentication, CachedTokenAuthentication])
+    def test_cached_mode_skips_auth_queries_when_warm(self):
+        for header in (f'Bearer {self.jwt}', f'Token {self.token.key}'):
+            client = self.client_for(header)
+            client.get('/articles/')
+            # count, page, authors, tags
+            with self.assertNumQueries(4):
+                self.assertEqual(client.get('/articles/').status_code, 200)
+
+    @patch.object(APIView, 'authentication_classes', [CachedJWTAuthentication, CachedTokenAuthentication])
+    def test_cached_users_are_dropped_on_change(self):
+        client = self.client_for(f'Token {self.token.key}')
+        client.get('/articles/')
+        self.owner.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner.save()
+        self.assertEqual(client.get('/articles/').status_code, 401)
+
+        self.owner.is_active = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner.save()
+        client.get('/articles/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        self.assertEqual(client.get('/articles/').status_code, 401)
+
+    @patch.object(APIView, 'authentication_classes', [CachedJWTAuthentication, CachedTokenAuthentication])
+    def test_cached_users_keep_no_password(self):
+        self.client_for(f'Bearer {self.jwt}').get('/articles/')
+        self.assertEqual(
+            get_cache().get(user_cache_key(self.owner.pk)),
+            {'id': self.owner.pk, 'username': 'owner', 'is_active': True, 'is_staff': False},
+        )
+        user = cached_user(self.owner.pk)
+        self.assertEqual((user.pk, user.username, user.is_authenticated), (self.owner.pk, 'owner', True))
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password('pass'))
+
+    @patch.object(APIView, 'authentication_classes', [JWTStatelessUserAuthentication])
+    def test_stateless_mode_and_owner_check_run_no_user_query(self):
+        client = self.client_for(f'Bearer {self.jwt}')
+        with self.assertNumQueries(4):
+            self.assertEqual(client.get('/articles/').status_code, 200)
+
+        # the owner is compared by id, without loading either user
+        with CaptureQueriesContext(connection) as queries:
+            response = client.patch(f'/articles/{self.article.id}/', {'title': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries if 'FROM "auth_user"' in query['sql']])
+
+        other = self.client_for(f'Bearer {AccessToken.for_user(self.other)}')
+        response = other.patch(f'/articles/{self.article.id}/', {'title': 'Stolen'}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class ArticleCommentStatsTestCase(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='stats', password='pass')
+        self.articles = [
+            Article.objects.create(title=f'Stats {i}', abstract='Abstract', publication_date='2023-01-01', user=self.user)
+            for i in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def stats(self, article):
+        article.refresh_from_db()
+        return article.comment_count, article.last_commented_at
+
+    def test_counters_follow_comment_writes(self):
+        first, second, _ = self.articles
+        comment = Comment.objects.create(article=first, user=self.user, text='One')
+        latest = Comment.objects.create(article=first, user=self.user, text='Two')
+        self.assertEqual(self.stats(first), (2, latest.created_at))
+
+        latest.article = second
+        latest.save()
+        self.assertEqual(self.stats(first), (1, comment.created_at))
+        self.assertEqual(self.stats(second), (1, latest.created_at))
+
+        comment.delete()
+        self.assertEqual(self.stats(first), (0, None))
+
+        response = self.client.post('/comments/bulk/', [{'article': second.id, 'text': 'Bulk'}] * 3, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.stats(second)[0], 4)
+
+    def test_filter_and_order_by_activity(self):
+        first, second, third = self.articles
+        Comment.objects.bulk_create([Comment(article=first, user=self.user, text='c')] * 1)
+        Comment.objects.bulk_create([Comment(article=second, user=self.user, text='c') for _ in range(3)])
+
+        response = self.client.get('/articles/?min_comments=2')
+        self.assertEqual([article['id'] for article in response.data['results']], [second.id])
+        self.assertEqual(response.data['results'][0]['comment_count'], 3)
+
+        response = self.client.get('/articles/?ordering=-last_commented_at')
+        self.assertEqual([article['id'] for article in response.data['results']], [second.id, first.id, third.id])
+        response = self.client.get('/articles/?ordering=last_commented_at')
+        self.assertEqual(response.data['results'][-1]['id'], third.id)
+
+        after = self.stats(first)[1].isoformat()
+        response = self.client.get('/articles/', {'commented_after': after, 'ordering': 'id'})
+        self.assertEqual([article['id'] for article in response.data['results']], [first.id, second.id])
+
+    def test_counters_are_read_only_and_cached_responses_refresh(self):
+        article = self.articles[0]
+        response = self.client.patch(f'/articles/{article.id}/', {'comment_count': 99}, format='json')
+        self.assertEqual(response.data['comment_count'], 0)
+
+        self.assertEqual(self.client.get(f'/articles/{article.id}/').data['comment_count'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(article=article, user=self.user, text='New')
+        self.assertEqual(self.client.get(f'/articles/{article.id}/').data['comment_count'], 1)
+
+    def test_rebuild_command(self):
+        article = self.articles[0]
+        comment = Comment.objects.create(article=article, user=self.user, text='One')
+        Article.objects.update(comment_count=7, last_commented_at=None)
+        call_command('rebuild_article_stats', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.stats(article), (1, comment.created_at))
+        self.assertEqual(self.stats(self.articles[1]), (0, None))
+
+
+class ExportJobTestCase(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media = TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        override = override_settings(MEDIA_ROOT=self.media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user(username='exporter', password='pass')
+        with self.captureOnCommitCallbacks(execute=True):
+            author = Author.objects.create(name='Export Author', email='export@example.com')
+            for year in (2021, 2022, 2022):
+                article = Article.objects.create(
+                    title=f'Export {year}', abstract='Abstract', publication_date=f'{year}-03-01', user=self.user
+                )
+                article.authors.add(author)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def run_worker(self):
+        call_command('run_export_worker', once=True, stdout=StringIO())
+
+    def test_job_lifecycle_and_csv_download(self):
+        response = self.client.post('/exports/', {'year': 2022, 'authors': ['Export Author']}, format='json')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.data['id']
+        self.assertEqual(response.data['status'], 'pending')
+        self.assertEqual(self.client.get(f'/exports/{job_id}/download/').status_code, 409)
+
+        self.run_worker()
+        job = self.client.get(f'/exports/{job_id}/').data
+        self.assertEqual((job['status'], job['rows']), ('done', 2))
+        self.assertTrue(job['download_url'].endswith(f'/exports/{job_id}/download/'))
+
+        response = self.client.get(f'/exports/{job_id}/download/')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row[0] for row in rows], ['Title', 'Export 2022', 'Export 2022'])
+
+    def test_identical_requests_share_a_job(self):
+        first = self.client.post('/exports/', {'format': 'jsonl', 'tags': ['b', 'a']}, format='json')
+        second = self.client.post('/exports/', {'format': 'jsonl', 'tags': ['a', 'b']}, format='json')
+        self.assertEqual(first.data['id'], second.data['id'])
+        self.run_worker()
+        third = self.client.post('/exports/', {'format': 'jsonl', 'tags': ['a', 'b']}, format='json')
+        self.assertEqual((third.status_code, third.data['id']), (200, first.data['id']))
+
+        other = self.client.post('/exports/', {'format': 'csv', 'tags': ['a', 'b']}, format='json')
+        self.assertNotEqual(other.data['id'], first.data['id'])
+
+        with override_settings(API_EXPORT_MAX_AGE=0):
+            fresh = self.client.post('/exports/', {'format': 'jsonl', 'tags': ['a', 'b']}, format='json')
+        self.assertNotEqual(fresh.data['id'], first.data['id'])
+
+    def test_jsonl_and_parquet_formats(self):
+        jsonl = self.client.post('/exports/', {'format': 'jsonl'}, format='json').data['id']
+        parquet = self.client.post('/exports/', {'format': 'parquet', 'year': 2021}, format='json').data['id']
+        self.run_worker()
+
+        response = self.client.get(f'/exports/{jsonl}/download/')
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0]['authors'], ['Export Author'])
+
+        job = ExportJob.objects.get(pk=parquet)
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            self.assertEqual(job.status, ExportJob.FAILED)
+            return
+        table = pq.read_table(job.file.path)
+        self.assertEqual(table.column('title').to_pylist(), ['Export 2021'])
+
+    def test_invalid_filters_and_stale_jobs(self):
+        response = self.client.post('/exports/', {'month': 13, 'format': 'xml'}, format='json')
+        self.assertEqual(set(response.data), {'month', 'format'})
+
+        job = ExportJob.objects.create(format='csv', params={}, params_hash='x', status=ExportJob.RUNNING,
+                                       started_at=timezone.now() - timedelta(days=1))
+        self.run_worker()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows), (ExportJob.DONE, 3))
+
+        with override_settings(API_EXPORT_RETENTION=0):
+            self.run_worker()
+        self.assertFalse(ExportJob.objects.exists())
+
+    def test_invalid_stored_params_fail_the_job(self):
+        job = ExportJob.objects.create(format='csv', params={'month': '13'}, params_hash='x')
+        self.run_worker()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.FAILED)
+        self.assertIn('month', job.error)
+        self.assertIsNotNone(job.finished_at)
+
+    @patch.object(APIView, 'authentication_classes', [JWTStatelessUserAuthentication])
+    def test_stateless_mode(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        response = client.post('/exports/', {'year': 2021}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(ExportJob.objects.get(pk=response.data['id']).user, self.user)
+        self.assertEqual([job['id'] for job in client.get('/exports/').data['results']], [response.data['id']])
+
+
+class NameFilterTestCase(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.python = Tag.objects.create(name='Python')
+            self.django = Tag.objects.create(name='Django')
+            self.author = Author.objects.create(name='Author George', email='georgeauthor@example.com')
+            self.both = self.article('Both', [self.python, self.django])
+            self.python_only = self.article('Python only', [self.python])
+            self.article('Neither', [])
+
+    def article(self, title, tags):
+        return self.create_article(title, authors=[self.author], tags=tags)
+
+    def titles(self, query):
+        response = self.client.get(f'/articles/?{query}&ordering=id')
+        self.assertEqual(response.status_code, 200)
+        return [article['title'] for article in response.data.get('results')]
+
+    def test_exact_match_ignores_case(self):
+        self.assertEqual(self.titles('tags=PYTHON'), ['Both', 'Python only'])
+        self.assertEqual(self.titles('tags=pyth'), [])
+        self.assertEqual(self.titles('authors=author%20george'), ['Both', 'Python only', 'Neither'])
+
+    def test_any_and_all(self):
+        self.assertEqual(self.titles('tags=python,django'), ['Both', 'Python only'])
+        self.assertEqual(self.titles('tags=python&tags=django'), ['Both', 'Python only'])
+        self.assertEqual(self.titles('tags=python,django&tags_match=all'), ['Both'])
+        self.assertEqual(self.titles('tags=python,rust&tags_match=all'), [])
+        self.assertEqual(self.client.get('/articles/?tags_match=some').status_code, 400)
+
+    def test_new_and_renamed_tags_are_found(self):
+        self.assertEqual(self.titles('tags=rust'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.python_only.tags.add(Tag.objects.create(name='Rust'))
+        self.assertEqual(self.titles('tags=rust'), ['Python only'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/tags/{self.django.id}/', {'name': 'Flask'}, format='json')
+        self.assertEqual(self.titles('tags=django'), [])
+        self.assertEqual(self.titles('tags=flask'), ['Both'])
+
+    def test_filter_queries_the_through_table_only(self):
+        with CaptureQueriesContext(connection) as queries:
+            list(ArticleFilter({'tags': 'python,django', 'tags_match': 'all'}, queryset=Article.objects.all()).qs)
+        sql = queries[-1]['sql']
+        self.assertNotIn('"articles_tag"', sql)
+        self.assertEqual(sql.count('EXISTS'), 2)
+
+    def test_tag_names_are_unique_ignoring_case(self):
+        response = self.client.post('/tags/', {'name': 'python'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(f'/tags/{self.python.id}/', {'name': 'PYTHON'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post('/tags/bulk/', [{'name': 'Go'}, {'name': 'go'}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Tag.objects.filter(name__iexact='go').exists())
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class FastSerializationTestCase(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        authors = [Author.objects.create(name=f'Author {i}', email=f'author{i}@example.com') for i in range(2)]
+        tags = [Tag.objects.create(name=f'Tag {i}') for i in range(3)]
+        for i in range(5):
+            article = self.create_article(
+                f'Article {i}', authors=authors[:i % 2 + 1], tags=tags[:i % 3], publication_date=f'2023-05-0{i + 1}'
+            )
+            Comment.objects.create(article=article, user=self.user, text=f'Comment {i}')
+        self.client.force_authenticate(self.user)
+
+    def get(self, path, values):
+        with override_settings(API_VALUES_SERIALIZERS=values):
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        for item in data['results']:
+            for name in ('authors', 'tags'):
+                if isinstance(item.get(name), list) and all(isinstance(pk, int) for pk in item[name]):
+                    item[name].sort()
+        return data
+
+    def test_values_serializer_matches_model_serializer(self):
+        for path in (
+            '/articles/', '/articles/?ordering=title', '/articles/?fields=id,tags,publication_date',
+            '/articles/?cursor=&page_size=2', '/articles/?expand=tags', '/comments/', '/comments/?cursor=&page_size=2',
+        ):
+            with self.subTest(path=path):
+                self.assertEqual(self.get(path, values=True), self.get(path, values=False))
+
+    def test_values_serializer_reads_relations_in_the_page_query(self):
+        # count, page with the author and tag ids
+        with override_settings(API_VALUES_SERIALIZERS=True), self.assertNumQueries(2):
+            self.client.get('/articles/')
+        with override_settings(API_VALUES_SERIALIZERS=True), self.assertNumQueries(4):
+            self.client.get('/articles/?expand=tags')
+
+    def test_keyset_next_link_from_values_rows(self):
+        data = self.get('/articles/?cursor=&page_size=2', values=True)
+        following = self.get(data['next'], values=True)
+        self.assertEqual([item['title'] for item in following['results']], ['Article 2', 'Article 1'])
+
+    @skipUnless(importlib.util.find_spec('orjson'), 'orjson is not installed')
+    def test_orjson_renderer_and_parser(self):
+        from .renderers import ORJSONParser, ORJSONRenderer
+
+        data = self.client.get('/articles/?ordering=id').data
+        self.assertEqual(json.loads(ORJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+        self.assertEqual(ORJSONParser().parse(BytesIO('{"name": "Ελληνικά"}'.encode())), {'name': 'Ελληνικά'})
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(BytesIO(b'{"name": '))
+        response = self.client.post('/tags/', '{"name": "Go"}', content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+
+class RoutingProbeView(PrimaryAfterWriteMixin, APIView):
+    permission_classes = []
+
+    def get(self, request):
+        return Response({'db': ReplicaRouter().db_for_read(Article)})
+
+    def post(self, request):
+        return Response(status=201)
+
+
+@patch('articles.db_routing.replica_configured', lambda: True)
+class ReplicaRoutingTestCase(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.factory = RequestFactory()
+        self.users = [
+            User.objects.create_user(username=name, email=f'{name}@example.com', password='pass123')
+            for name in ('george', 'john')
+        ]
+        self.tokens = [Token.objects.create(user=user).key for user in self.users]
+
+    def view(self, request):
+        # replica_configured() is patched for the test methods only
+        return ReplicaRoutingMiddleware(RoutingProbeView.as_view())(request)
+
+    def read_db(self, token=None, **cookies):
+        request = self.factory.get('/', **({'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}))
+        request.COOKIES.update(cookies)
+        return json.loads(self.view(request).render().content)['db']
+
+    def test_reads_go_to_the_replica_and_writes_to_the_primary(self):
+        self.assertEqual(self.read_db(), 'replica')
+        self.assertEqual(self.read_db(self.tokens[0]), 'replica')
+        self.assertEqual(ReplicaRouter().db_for_write(Article), 'default')
+        self.assertIsNone(ReplicaRouter().db_for_read(Article))
+        self.assertFalse(ReplicaRouter().allow_migrate('replica', 'articles'))
+
+    def test_writer_reads_from_the_primary_for_a_while(self):
+        response = self.view(self.factory.post('/', HTTP_AUTHORIZATION=f'Token {self.tokens[0]}'))
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], settings.DB_REPLICA_PIN_SECONDS)
+        self.assertIsNone(self.read_db(self.tokens[0]))
+        self.assertIsNone(self.read_db(**{PIN_COOKIE: '1'}))
+        self.assertEqual(self.read_db(self.tokens[1]), 'replica')
+        get_cache().delete(pin_key(self.users[0].pk))
+        self.assertEqual(self.read_db(self.tokens[0]), 'replica')
+
+
+@override_settings(CACHES=TEST_CACHES, API_CACHE_ALIAS='default', API_PROFILING=False)
+class ChangeFeedTestCase(TransactionTestCase):
+    # entries are only served once their transaction has ended, which
+    # never happens inside a TestCase
+    def setUp(self):
+        reset_caches()
+        self.user = User.objects.create_user(username='George', email='george@example2.com', password='george123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def poll(self, url='/changes/'):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        entries = [(entry['model'], entry['object_id'], entry['action']) for entry in response.data['results']]
+        return entries, response.data
+
+    def test_feed_follows_inserts_updates_and_deletes(self):
+        article = Article.objects.create(title='Title', abstract='Abstract', publication_date='2023-05-03', user=self.user)
+        entries, data = self.poll()
+        self.assertEqual(entries, [('article', article.id, 'create')])
+        self.assertFalse(data['more'])
+
+        article.title = 'Renamed'
+        article.save()
+        comment = Comment.objects.create(article=article, user=self.user, text='Comment')
+        entries, data = self.poll(data['next'])
+        self.assertEqual(entries, [
+            ('article', article.id, 'update'), ('comment', comment.id, 'create'), ('article', article.id, 'update'),
+        ])
+
+        article_id, comment_id = article.id, comment.id
+        article.delete()
+        entries, data = self.poll(data['next'])
+        self.assertEqual(entries[0], ('comment', comment_id, 'delete'))
+        self.assertEqual(entries[-1], ('article', article_id, 'delete'))
+        self.assertEqual(self.poll(data['next'])[0], [])
+        self.assertEqual(self.poll('/changes/?model=comment')[0], [
+            ('comment', comment_id, 'create'), ('comment', comment_id, 'delete'),
+        ])
+
+    def test_pages_and_unsettled_entries(self):
+        # an entry of a transaction that may still be running holds back
+        # everything after it
+        ChangeLogEntry.objects.create(model='article', object_id=0, action='update', txid=2 ** 62)
+        articles = [
+            Article.objects.create(title=f'Article {i}', abstract='Abstract', publication_date='2023-05-03', user=self.user)
+            for i in range(3)
+        ]
+        entries, data = self.poll('/changes/?page_size=2')
+        self.assertEqual([object_id for _, object_id, _ in entries], [articles[0].id, articles[1].id])
+        self.assertTrue(data['more'])
+        entries, data = self.poll(data['next'])
+        self.assertEqual([object_id for _, object_id, _ in entries], [articles[2].id])
+        self.assertFalse(data['more'])
+        self.assertEqual(self.client.get('/changes/?since=bogus').status_code, 404)
+
+
+class ArticleTimestampsTestCase(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.article = self.create_article('Title')
+        self.tag = Tag.objects.create(name='Python')
+        self.past = timezone.now() - timedelta(days=1)
+        Article.objects.filter(pk=self.article.pk).update(created_at=self.past, updated_at=self.past)
+
+    def updated_at(self):
+        return Article.objects.get(pk=self.article.pk).updated_at
+
+    def test_bulk_update_and_relations_touch_updated_at(self):
+        response = self.client.patch('/articles/bulk/', [{'id': self.article.id, 'title': 'Renamed'}], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(self.updated_at(), self.past)
+        Article.objects.filter(pk=self.article.pk).update(updated_at=self.past)
+        self.tag.articles.add(self.article)
+        self.assertGreater(self.updated_at(), self.past)
+        self.assertEqual(Article.objects.get(pk=self.article.pk).created_at, self.past)
+
+    def test_changes_are_logged(self):
+        self.article.tags.add(self.tag)
+        ChangeLogEntry.objects.all().delete()
+        self.tag.delete()
+        self.assertTrue(ChangeLogEntry.objects.filter(model='article', object_id=self.article.id, action='update').exists())
+        self.assertFalse(ChangeLogEntry.objects.settled().exists())
+
+
+class ArticleRelationWriteTestCase(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = Author.objects.create(name='Author', email='author@example.com')
+        self.tags = Tag.objects.bulk_create([Tag(name=f'Tag {i}') for i in range(60)])
+
+    def tag_ids(self, start, stop):
+        return [tag.id for tag in self.tags[start:stop]]
+
+    def create_article(self, tag_ids):
+        return self.client.post('/articles/', {
+            'title': 'Article', 'abstract': 'Abstract', 'publication_date': '2023-05-03',
+            'user': self.user.id, 'authors': [self.author.id], 'tags': tag_ids,
+        }, format='json')
+
+    def test_create_query_count_is_independent_of_tag_count(self):
+        # token lookup, user, authors and tags in_bulk, savepoint, article
+        # insert, change log, authors and tags through inserts, release
+        for count in (3, 50):
+            with self.subTest(count=count), self.assertNumQueries(10):
+                response = self.create_article(self.tag_ids(0, count))
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.data['tags'], self.tag_ids(0, count))
+            article = Article.objects.get(pk=response.data['id'])
+            self.assertEqual(sorted(article.tags.values_list('id', flat=True)), self.tag_ids(0, count))
+
+    def test_update_writes_only_the_difference(self):
+        article = Article.objects.get(pk=self.create_article(self.tag_ids(0, 50)).data['id'])
+        through = Article.tags.through
+        kept = set(through.objects.filter(article=article, tag_id__in=self.tag_ids(10, 50)).values_list('id', flat=True))
+        # token lookup, article, authors and tags prefetch, tags in_bulk,
+        # savepoint, article update, change log, through delete and insert, release
+        with self.assertNumQueries(11):
+            response = self.client.patch(f'/articles/{article.id}/', {'tags': self.tag_ids(10, 60)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['tags'], self.tag_ids(10, 60))
+        self.assertEqual(response.data['authors'], [self.author.id])
+        rows = set(through.objects.filter(article=article).values_list('id', flat=True))
+        self.assertLessEqual(kept, rows)
+        self.assertEqual(sorted(article.tags.values_list('id', flat=True)), self.tag_ids(10, 60))
+
+    def test_unchanged_tags_write_nothing(self):
+        article_id = self.create_article(self.tag_ids(0, 5)).data['id']
+        # token lookup, article, authors and tags prefetch, tags in_bulk,
+        # savepoint, article update, change log, release
+        with self.assertNumQueries(9):
+            response = self.client.patch(f'/articles/{article_id}/', {'tags': self.tag_ids(0, 5)}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_unknown_and_malformed_ids_are_rejected(self):
+        missing = max(self.tag_ids(0, 60)) + 1
+        response = self.create_article([self.tags[0].id, missing])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['tags'], [f'Invalid pk "{missing}" - object does not exist.'])
+        response = self.create_article(['x'])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['tags'], ['Incorrect type. Expected pk value, received str.'])
+        self.assertFalse(Article.objects.exists())
+
+    def test_duplicate_ids_are_written_once(self):
+        response = self.create_article([self.tags[0].id, self.tags[0].id, self.tags[1].id])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['tags'], self.tag_ids(0, 2))
+
+
+class ArticleCommentThreadTestCase(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.articles = [self.create_article(f'Article {i}') for i in range(3)]
+        start = timezone.now() - timedelta(days=1)
+        self.comments = {}
+        for article, count in zip(self.articles, (5, 2, 0)):
+            comments = [Comment.objects.create(article=article, user=self.user, text=f'Comment {i}') for i in range(count)]
+            for i, comment in enumerate(comments):
+                Comment.objects.filter(pk=comment.pk).update(created_at=start + timedelta(minutes=i))
+            self.comments[article.id] = [comment.id for comment in comments]
+
+    @override_settings(API_CACHE_TIMEOUT=0)
+    def test_thread_is_keyset_paginated_oldest_first(self):
+        article = self.articles[0]
+        url, ids = f'/articles/{article.id}/comments/?page_size=2', []
+        while url:
+            # token lookup, article, page
+            with self.assertNumQueries(3):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [comment['id'] for comment in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(ids, self.comments[article.id])
+        self.assertEqual(response.data['results'][0]['username'], 'George')
+
+    def test_thread_follows_username_changes(self):
+        url = f'/articles/{self.articles[0].id}/comments/'
+        self.assertEqual(self.client.get(url).data['results'][0]['username'], 'George')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.last_login = timezone.now()
+            self.user.save(update_fields=['last_login'])
+        self.assertEqual(self.client.get(url).data['results'][0]['username'], 'George')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.username = 'Georgia'
+            self.user.save()
+        self.assertEqual(self.client.get(url).data['results'][0]['username'], 'Georgia')
+
+    def test_thread_of_unknown_article_is_not_found(self):
+        response = self.client.get(f'/articles/{self.articles[-1].id + 1}/comments/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_comments_filter_by_article(self):
+        article = self.articles[1]
+        response = self.client.get(f'/comments/?article={article.id}')
+        self.assertEqual(sorted(comment['id'] for comment in response.data['results']), self.comments[article.id])
+
+    @override_settings(API_CACHE_TIMEOUT=0)
+    def test_latest_comments_in_one_query(self):
+        ids = ','.join(str(article.id) for article in self.articles)
+        # token lookup, ranked comments
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/articles/latest_comments/?ids={ids}&limit=3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(thread['article'], [comment['id'] for comment in thread['comments']]) for thread in response.data['results']],
+            [(article.id, self.comments[article.id][::-1][:3]) for article in self.articles]
+        )
+
+    def test_latest_comments_validates_parameters(self):
+        for query in ('', 'ids=x', f'ids={self.articles[0].id}&limit=0', f'ids={self.articles[0].id}&limit=1000'):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f'/articles/latest_comments/?{query}').status_code, 400)
+
+
+class ArticleFacetsTestCase(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.python, self.java = Tag.objects.create(name='Python'), Tag.objects.create(name='Java')
+            self.author = Author.objects.create(name='Author George', email='georgeauthor@example.com')
+            for title, date, tags in [
+                ('Python basics', '2022-01-10', [self.python]),
+                ('Python and Java', '2022-01-20', [self.python, self.java]),
+                ('Java streams', '2022-03-05', [self.java]),
+                ('Python typing', '2023-03-01', [self.python]),
+            ]:
+                self.create_article(title, authors=[self.author], tags=tags, publication_date=date)
+
+    @override_settings(API_CACHE_TIMEOUT=0)
+    def test_facets_of_all_articles(self):
+        # token lookup, years/months, tags, authors
+        with self.assertNumQueries(4):
+            response = self.client.get('/articles/facets/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual(response.data['years'], [{'year': 2022, 'count': 3}, {'year': 2023, 'count': 1}])
+        self.assertEqual(response.data['months'], [
+            {'year': 2022, 'month': 1, 'count': 2}, {'year': 2022, 'month': 3, 'count': 1},
+            {'year': 2023, 'month': 3, 'count': 1},
+        ])
+        self.assertEqual(response.data['tags'], [
+            {'id': self.python.id, 'name': 'Python', 'count': 3}, {'id': self.java.id, 'name': 'Java', 'count': 2},
+        ])
+        self.assertEqual(response.data['authors'], [{'id': self.author.id, 'name': 'Author George', 'count': 4}])
+
+    def test_facets_follow_the_article_filters(self):
+        response = self.client.get('/articles/facets/?tags=java&year=2022')
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual([tag['count'] for tag in response.data['tags']], [2, 1])
+        response = self.client.get('/articles/facets/?keywords=typing')
+        self.assertEqual(response.data['years'], [{'year': 2023, 'count': 1}])
+
+    def test_facets_are_cached_until_an_article_changes(self):
+        first = self.client.get('/articles/facets/')
+        # token lookup only
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/articles/facets/').data, first.data)
+        with self.captureOnCommitCallbacks(execute=True):
+            Article.objects.first().tags.remove(self.python)
+        self.assertEqual(self.client.get('/articles/facets/').data['tags'][0]['count'], 2)
+
+
+class ThrottlingTestCase(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_article()
+
+    def test_bucket_refills_over_time(self):
+        bucket, wait = refill_and_spend(None, 10, 1.0, 4, now=100.0)
+        self.assertEqual((bucket, wait), ((6, 100.0), None))
+        bucket, wait = refill_and_spend(bucket, 10, 1.0, 8, now=101.0)
+        self.assertEqual((bucket, wait), ((7.0, 101.0), 1.0))
+        # never above capacity, and an oversized cost waits for a full bucket
+        self.assertEqual(refill_and_spend(bucket, 10, 1.0, 50, now=500.0), ((0.0, 500.0), None))
+
+    def test_anonymous_writes_are_limited_per_ip(self):
+        for backend in ('memory', 'cache'):
+            with self.subTest(backend=backend), override_settings(
+                API_THROTTLE_BACKEND=backend, API_THROTTLE_RATES={'anon_write': '2/min'}
+            ):
+                client = APIClient(REMOTE_ADDR=f'203.0.113.{len(backend)}')
+                statuses = [client.post('/api/token/', {}, format='json').status_code for _ in range(3)]
+                self.assertEqual(statuses, [400, 400, 429])
+                response = client.post('/api/token/', {}, format='json')
+                self.assertTrue(1 <= int(response['Retry-After']) <= 30)
+                # another client keeps its own bucket
+                self.assertEqual(APIClient(REMOTE_ADDR='203.0.113.99').post('/api/token/', {}).status_code, 400)
+
+    @override_settings(API_THROTTLE_RATES={'user_read': '10/min'}, API_CACHE_TIMEOUT=0)
+    def test_large_pages_cost_more(self):
+        # a 500-row page is five default pages
+        statuses = [self.client.get('/articles/?page_size=500').status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+
+    def test_exports_cost_more(self):
+        with override_settings(API_THROTTLE_RATES={'user_read': f'{settings.API_THROTTLE_EXPORT_COST + 1}/min'}):
+            self.assertEqual(self.client.get('/articles//download/').status_code, 200)
+            self.assertEqual(self.client.get('/articles//download/').status_code, 429)
+            self.assertEqual(self.client.get('/articles/').status_code, 200)
+
+
+class PartitionCommentsTestCase(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.article = self.create_article()
+        self.comments = {}
+        for year in (2021, 2022, 2022):
+            comment = Comment.objects.create(article=self.article, user=self.user, text=f'Comment of {year}')
+            Comment.objects.filter(pk=comment.pk).update(created_at=partitioning.year_start(year) + timedelta(days=40))
+            self.comments.setdefault(year, []).append(comment.id)
+
+    def partitions_scanned(self, queryset):
+        plan = queryset.explain()
+        return sorted(name for name in plan.split() if name.startswith(partitioning.partition_name('')))
+
+    def test_convert_keeps_rows_triggers_and_foreign_keys(self):
+        call_command('partition_comments', '--convert', '--ahead=1', stdout=StringIO())
+        with connection.cursor() as cursor:
+            self.assertTrue(partitioning.is_partitioned(cursor))
+            years = partitioning.partition_years(cursor)
+        self.assertEqual(years, list(range(2021, timezone.now().year + 2)))
+        self.assertEqual(sorted(Comment.objects.values_list('id', flat=True)), self.comments[2021] + self.comments[2022])
+        # the comment counter triggers were carried over, and new ids follow the old ones
+        comment = Comment.objects.create(article=self.article, user=self.user, text='New')
+        self.assertGreater(comment.id, max(self.comments[2022]))
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.comment_count, 4)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Comment.objects.create(article_id=self.article.id + 100, user=self.user, text='Orphan')
+            connection.check_constraints()
+
+    def test_year_filter_prunes_partitions(self):
+        call_command('partition_comments', '--convert', stdout=StringIO())
+        response = self.client.get('/comments/?year=2022')
+        self.assertEqual(sorted(comment['id'] for comment in response.data['results']), self.comments[2022])
+        queryset = CommentFilter({'year': 2022, 'month': 2}, queryset=Comment.objects.all()).qs
+        self.assertEqual(self.partitions_scanned(queryset), [partitioning.partition_name(2022)])
+
+    def test_create_ahead_and_detach(self):
+        with self.assertRaises(CommandError):
+            call_command('partition_comments', stdout=StringIO())
+        call_command('partition_comments', '--convert', '--ahead=0', stdout=StringIO())
+        out = StringIO()
+        call_command('partition_comments', '--ahead=2', '--detach-before=2022', stdout=out)
+        next_years = [partitioning.partition_name(timezone.now().year + i) for i in (1, 2)]
+        self.assertEqual(out.getvalue().split(), [
+            'Created', f'{next_years[0]}.', 'Created', f'{next_years[1]}.', 'Detached', f'{partitioning.partition_name(2021)}.',
+        ])
+        self.assertEqual(sorted(Comment.objects.values_list('id', flat=True)), self.comments[2022])
+        # the archive no longer references the article
+        self.article.delete()
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {partitioning.partition_name(2021)}')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+class ExportFormatTestCase(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='exporter', password='pass')
+        author = Author.objects.create(name='Export Author', email='export@example.com')
+        tags = [Tag.objects.create(name='Python'), Tag.objects.create(name='Django')]
+        for year in (2021, 2022, 2022):
+            article = Article.objects.create(
+                title=f'Export {year}', abstract='Abstract', publication_date=f'{year}-03-01', user=self.user
+            )
+            article.authors.add(author)
+            article.tags.set(tags)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self, query):
+        response = self.client.get(f'/articles//download/{query}')
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_stays_the_default(self):
+        response, content = self.download('')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(content, self.download('?format=csv')[1])
+
+    def test_jsonl_keeps_lists_and_filters(self):
+        response, content = self.download('?format=jsonl&year=2022&tags=python')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="articles.jsonl"')
+        records = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual([record['title'] for record in records], ['Export 2022', 'Export 2022'])
+        self.assertEqual(records[0]['authors'], ['Export Author'])
+        self.assertEqual(sorted(records[0]['tags']), ['Django', 'Python'])
+
+    @skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow is not installed')
+    @override_settings(ARTICLE_EXPORT_CHUNK_SIZE=2)
+    def test_parquet_is_streamed_in_row_groups(self):
+        import pyarrow.parquet as pq
+
+        response = self.client.get('/articles//download/?format=parquet')
+        chunks = list(response.streaming_content)
+        # a row group of two rows, then the last row and the footer
+        self.assertEqual(len(chunks), 2)
+        parquet = pq.ParquetFile(BytesIO(b''.join(chunks)))
+        self.assertEqual(parquet.metadata.num_row_groups, 2)
+        table = parquet.read()
+        self.assertEqual(table.num_rows, 3)
+        self.assertEqual(sorted(table.column('tags').to_pylist()[0]), ['Django', 'Python'])
+
+    def test_unknown_format_and_errors(self):
+        self.assertEqual(self.client.get('/articles//download/?format=xml').status_code, 404)
+        response = APIClient().get('/articles//download/?format=jsonl')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('detail', json.loads(response.content))
+
+    def test_invalid_filters_are_rejected(self):
+        for query in ('?year=abc', '?month=13', '?year=0', '?tags_match=some'):
+            response = self.client.get(f'/articles//download/{query}')
+            self.assertEqual(response.status_code, 400, query)
+            self.assertEqual(response['Content-Type'], 'application/json')
+        # month alone still matches every year
+        response, content = self.download('?format=jsonl&month=3')
+        self.assertEqual(len(content.splitlines()), 3)
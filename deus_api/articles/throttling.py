@@ -0,0 +1,103 @@
+"""Token-bucket throttling with per-request costs.
+
+Every client has a bucket per scope: authenticated users are keyed on
+their id, anonymous clients on their IP. A bucket holds up to N tokens and
+refills at N per period, from rates such as '1200/min' in
+API_THROTTLE_RATES under '<user|anon>_<scope>'. The scope is 'read' for
+safe methods and 'write' otherwise unless the view's
+``throttle_scope_by_action`` names another. A request spends its cost:
+``throttle_cost_by_action`` on the view, times the number of default pages
+in a larger ?page_size=. Rejected requests carry Retry-After.
+
+API_THROTTLE_BACKEND picks where buckets live: 'memory' keeps them in the
+process, which suits a single node; 'cache' keeps them in the API cache so
+all nodes share them. The cache backend reads and writes a bucket without a
+lock, so concurrent requests of one client may overspend it slightly.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle, SimpleRateThrottle
+
+from .cache import get_cache
+
+
+class MemoryBuckets:
+    """Buckets of this process, least recently used dropped past API_THROTTLE_MEMORY_KEYS."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = OrderedDict()
+
+    def spend(self, key, capacity, rate, cost, now, duration):
+        with self.lock:
+            bucket = self.buckets.pop(key, None)
+            bucket, wait = refill_and_spend(bucket, capacity, rate, cost, now)
+            self.buckets[key] = bucket
+            while len(self.buckets) > settings.API_THROTTLE_MEMORY_KEYS:
+                self.buckets.popitem(last=False)
+        return wait
+
+
+class CacheBuckets:
+    def spend(self, key, capacity, rate, cost, now, duration):
+        cache = get_cache()
+        bucket, wait = refill_and_spend(cache.get(key), capacity, rate, cost, now)
+        # an untouched bucket is full again after one period
+        cache.set(key, bucket, math.ceil(duration))
+        return wait
+
+
+BACKENDS = {'memory': MemoryBuckets(), 'cache': CacheBuckets()}
+
+
+def refill_and_spend(bucket, capacity, rate, cost, now):
+    """The bucket ``(tokens, timestamp)`` after a request costing ``cost``, and the wait if refused."""
+    tokens, last = bucket if bucket is not None else (capacity, now)
+    tokens = min(capacity, tokens + max(0, now - last) * rate)
+    # a request may cost more than a whole bucket; it then needs a full one
+    cost = min(cost, capacity)
+    if tokens >= cost:
+        return (tokens - cost, now), None
+    return (tokens, now), (cost - tokens) / rate
+
+
+class TokenBucketThrottle(BaseThrottle):
+    timer = time.time
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        scope = self.get_scope(request, view)
+        identity = 'user' if request.user and request.user.is_authenticated else 'anon'
+        rate = settings.API_THROTTLE_RATES.get(f'{identity}_{scope}')
+        if not rate:
+            return True
+        capacity, duration = SimpleRateThrottle.parse_rate(None, rate)
+        ident = request.user.pk if identity == 'user' else self.get_ident(request)
+        backend = BACKENDS[settings.API_THROTTLE_BACKEND]
+        self.wait_seconds = backend.spend(
+            f'throttle:{identity}_{scope}:{ident}', capacity, capacity / duration,
+            self.get_cost(request, view), self.timer(), duration
+        )
+        return self.wait_seconds is None
+
+    def wait(self):
+        return self.wait_seconds
+
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scope_by_action', {}).get(getattr(view, 'action', None))
+        if scope:
+            return scope
+        return 'read' if request.method in SAFE_METHODS else 'write'
+
+    def get_cost(self, request, view):
+        cost = getattr(view, 'throttle_cost_by_action', {}).get(getattr(view, 'action', None), 1)
+        paginator = getattr(view, 'paginator', None)
+        default_size = getattr(paginator, 'page_size', None)
+        if default_size and hasattr(paginator, 'get_page_size'):
+            cost *= max(1, math.ceil((paginator.get_page_size(request) or 0) / default_size))
+        return cost
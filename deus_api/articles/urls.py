@@ -17,7 +17,8 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from articles.views import (AuthorViewSet, TagViewSet, ArticleViewSet, CommentViewSet, ArticleExport)
+from articles.views import (AuthorViewSet, TagViewSet, ArticleViewSet, CommentViewSet, ArticleExport, ExportJobViewSet,
+                            ChangeLogViewSet)
 
 
 router = DefaultRouter()
@@ -26,6 +27,8 @@ router.register('tags', TagViewSet)
 router.register('articles', ArticleViewSet)
 router.register('comments', CommentViewSet)
 router.register('articles//download', ArticleExport, basename='article-export')  
+router.register('exports', ExportJobViewSet, basename='export')
+router.register('changes', ChangeLogViewSet, basename='change')
 
 
 urlpatterns = [
@@ -1,22 +1,80 @@
-from articles.models import Author, Tag, Article, Comment
-from .serializers import AuthorSerializer, TagSerializer, ArticleSerializer, CommentSerializer
-from rest_framework import viewsets
+import importlib.util
+from articles.models import Author, Tag, Article, Comment, ExportJob, ChangeLogEntry
+from .serializers import (
+    AuthorSerializer, TagSerializer, ArticleSerializer, CommentSerializer, ExportJobSerializer, ValuesSerializer,
+    ChangeLogEntrySerializer, ThreadCommentSerializer, sparse_fieldset,
+)
+from .facets import article_facets
+from .exports import (
+    EXPORT_FORMATS, EXPORT_STREAMS, CSVExportRenderer, JSONLinesExportRenderer, ParquetExportRenderer, export_params,
+    export_prefetch, filter_articles, params_hash,
+)
+from .jobs import reusable_job
+from .filters import ArticleFilter, CommentFilter
+from .pagination import ChangeFeedPagination, CustomPagination, KeysetPagination
+from .cache import CachedResponseMixin
+from .async_views import AsyncReadMixin
+from .db_routing import PrimaryAfterWriteMixin
+from rest_framework import mixins, viewsets
 from rest_framework.views import APIView
 from rest_framework import filters
-from rest_framework.pagination import PageNumberPagination
 from django_filters import rest_framework as django_filters
-import csv
-from django.http import HttpResponse
-from rest_framework.decorators import api_view, permission_classes
+from asgiref.sync import sync_to_async
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
+from django.http import FileResponse, StreamingHttpResponse
+from django.conf import settings
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.db import IntegrityError, transaction
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import IntegerField, empty
+from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status, permissions
 from rest_framework.response import Response
 
-class CustomPagination(PageNumberPagination):
-    page_size = 100
-    page_size_query_param = 'page_size'
+def lookup_name(lookup):
+    return getattr(lookup, 'prefetch_to', lookup).split('__')[0]
 
-class CommonViewSet(viewsets.ModelViewSet):
+
+def bulk_errors(errors):
+    """Per-item errors as [{'index': i, 'errors': ...}], whatever form DRF reported them in."""
+    items = errors.items() if isinstance(errors, dict) else enumerate(errors)
+    return {'errors': [{'index': index, 'errors': error} for index, error in items if error]}
+
+
+def validate_bulk_ids(ids):
+    """``ids`` as integers, and the errors of those that are not by index."""
+    field = IntegerField()
+    valid, errors = [], {}
+    for index, pk in enumerate(ids):
+        try:
+            valid.append(field.run_validation(pk))
+        except ValidationError as exc:
+            errors[index] = {'id': exc.detail}
+    return valid, errors
+
+
+class CommonViewSet(PrimaryAfterWriteMixin, CachedResponseMixin, AsyncReadMixin, viewsets.ModelViewSet):
+    # Related objects the serializer touches, per action, so list pages and
+    # detail views are loaded with a fixed number of queries.
+    select_related_by_action = {}
+    prefetch_related_by_action = {}
+    # ?fields=/?expand= handling (see SparseFieldsMixin): the lookup that
+    # replaces a default prefetch, and annotations computed for expansion.
+    sparse_fieldset_actions = ('list', 'retrieve')
+    expand_prefetch = {}
+    expand_annotations = {}
+    # Unique ordering used by keyset pagination (?cursor=), backed by an index.
+    keyset_ordering = ('id',)
+    # Actions served from .values() rows when API_VALUES_SERIALIZERS is on.
+    values_actions = ()
+    # Throttling (see articles.throttling): bucket per action, defaulting to
+    # 'read'/'write' by method, and requests' cost in tokens, defaulting to 1.
+    throttle_scope_by_action = {}
+    throttle_cost_by_action = {}
     permission_classes_by_action = {
         'list':[permissions.IsAuthenticated],
         'create': [permissions.IsAuthenticated], 
@@ -24,36 +82,198 @@ class CommonViewSet(viewsets.ModelViewSet):
         'update': [permissions.IsAuthenticated],            
         'partial_update': [permissions.IsAuthenticated],    
         'destroy': [permissions.IsAuthenticated],           
+        'bulk': [permissions.IsAuthenticated],
     }
     def get_permissions(self):
         try:
             return [permission() for permission in self.permission_classes_by_action[self.action]]
         except KeyError:
             return False
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        select_related = self.select_related_by_action.get(self.action, [])
+        prefetch_related = self.prefetch_related_by_action.get(self.action, [])
+        if self.action in self.sparse_fieldset_actions:
+            fields, expand = sparse_fieldset(self.request)
+            queryset, select_related, prefetch_related = self.apply_sparse_fieldset(
+                queryset, fields, expand, select_related, prefetch_related
+            )
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
+
+    def apply_sparse_fieldset(self, queryset, fields, expand, select_related, prefetch_related):
+        """Load only what ?fields= and ?expand= ask the serializer to render."""
+        if fields:
+            wanted = fields | expand
+            select_related = [lookup for lookup in select_related if lookup.split('__')[0] in wanted]
+            prefetch_related = [lookup for lookup in prefetch_related if lookup_name(lookup) in wanted]
+            model = queryset.model
+            columns = {field.name for field in model._meta.concrete_fields if field.name in wanted}
+            columns.add(model._meta.pk.name)
+            columns.update(field.lstrip('-') for field in self.keyset_ordering)
+            queryset = queryset.only(*columns)
+        prefetch_related = [
+            self.expand_prefetch[lookup_name(lookup)] if lookup_name(lookup) in expand & set(self.expand_prefetch) else lookup
+            for lookup in prefetch_related
+        ]
+        annotations = {name: self.expand_annotations[name]() for name in expand & set(self.expand_annotations)}
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+        return queryset, select_related, prefetch_related
+
+    @cached_property
+    def values_serializer(self):
+        """The ValuesSerializer of this request, or None when it takes the regular path."""
+        if not settings.API_VALUES_SERIALIZERS or self.action not in self.values_actions:
+            return None
+        if sparse_fieldset(self.request)[1]:
+            # ?expand= nests serializers
+            return None
+        serializer_class = self.get_serializer_class()
+        return ValuesSerializer.for_serializer(serializer_class(context=self.get_serializer_context()))
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.values_serializer is not None:
+            queryset = self.values_serializer.rows(
+                queryset, extra=[field.lstrip('-') for field in self.keyset_ordering]
+            )
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        if kwargs.get('many') and self.values_serializer is not None:
+            return self.values_serializer.bind(args[0])
+        return super().get_serializer(*args, **kwargs)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['batch_size'] = self.get_bulk_batch_size()
+        return context
+
+    def get_bulk_batch_size(self):
+        try:
+            batch_size = int(self.request.query_params.get('batch_size', settings.API_BULK_BATCH_SIZE))
+        except (TypeError, ValueError):
+            batch_size = settings.API_BULK_BATCH_SIZE
+        return min(max(batch_size, 1), settings.API_BULK_MAX_ITEMS)
+
+    def prepare_bulk_item(self, request, item):
+        return item
+
+    def has_bulk_object_permission(self, request, obj, action):
+        return all(
+            permission().has_object_permission(request, self, obj)
+            for permission in self.permission_classes_by_action[action]
+        )
+
+    @action(detail=False, methods=['post', 'patch', 'delete'])
+    def bulk(self, request):
+        """Create (POST), partially update (PATCH) or delete (DELETE) a list of objects.
+
+        The whole list is written in one transaction, or nothing is written
+        and the response lists the errors of each failing item by index.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response({'detail': 'Expected a list of items.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.API_BULK_MAX_ITEMS:
+            return Response(
+                {'detail': f'At most {settings.API_BULK_MAX_ITEMS} items are accepted per request.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if request.method == 'POST':
+            return self.bulk_create(request, items)
+        if request.method == 'PATCH':
+            return self.bulk_update(request, items)
+        return self.bulk_destroy(request, items)
+
+    def bulk_create(self, request, items):
+        items = [self.prepare_bulk_item(request, item) for item in items]
+        serializer = self.get_serializer(data=items, many=True)
+        if not serializer.is_valid():
+            return Response(bulk_errors(serializer.errors), status=status.HTTP_400_BAD_REQUEST)
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            # e.g. two items of the list carrying the same unique value
+            return Response({'detail': 'The items conflict with each other or with existing objects.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def bulk_update(self, request, items):
+        ids, errors = validate_bulk_ids([item.get('id', empty) if isinstance(item, dict) else empty for item in items])
+        if errors:
+            return Response(bulk_errors(errors), status=status.HTTP_400_BAD_REQUEST)
+        items = [{**item, 'id': pk} for item, pk in zip(items, ids)]
+        instances = self.get_queryset().in_bulk(ids)
+        forbidden = {
+            index: {'detail': 'You do not have permission to perform this action.'}
+            for index, pk in enumerate(ids)
+            if pk in instances and not self.has_bulk_object_permission(request, instances[pk], 'partial_update')
+        }
+        if forbidden:
+            return Response(bulk_errors(forbidden), status=status.HTTP_403_FORBIDDEN)
+        serializer = self.get_serializer(instances, data=items, many=True, partial=True)
+        if not serializer.is_valid():
+            return Response(bulk_errors(serializer.errors), status=status.HTTP_400_BAD_REQUEST)
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            # e.g. two items of the list carrying the same unique value
+            return Response({'detail': 'The items conflict with each other or with existing objects.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(serializer.data)
+
+    def bulk_destroy(self, request, items):
+        ids, errors = validate_bulk_ids(items)
+        if errors:
+            return Response(bulk_errors(errors), status=status.HTTP_400_BAD_REQUEST)
+        instances = self.get_queryset().in_bulk(ids)
+        for index, pk in enumerate(ids):
+            if pk not in instances:
+                errors[index] = {'detail': 'No object with this id.'}
+            elif not self.has_bulk_object_permission(request, instances[pk], 'destroy'):
+                errors[index] = {'detail': 'You do not have permission to perform this action.'}
+        if errors:
+            return Response(bulk_errors(errors), status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            self.get_queryset().filter(pk__in=instances).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     pagination_class = CustomPagination
 
 class AuthorViewSet(CommonViewSet):
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
+    cache_models = (Author,)
 
 class TagViewSet(CommonViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    cache_models = (Tag,)
 
 
-class ArticleFilter(django_filters.FilterSet):
-    year = django_filters.NumberFilter(field_name='publication_date__year')
-    month = django_filters.NumberFilter(field_name='publication_date__month')
-    authors = django_filters.CharFilter(field_name='authors__name', lookup_expr='icontains')
-    tags = django_filters.CharFilter(field_name='tags__name', lookup_expr='icontains')
-    keywords = django_filters.CharFilter(field_name='title', method='filter_keywords')
+class ArticleOrderingFilter(filters.OrderingFilter):
+    # never-commented articles sort last in either direction
+    nulls_last_fields = ('last_commented_at',)
 
-    def filter_keywords(self, queryset, name, value):
-        return queryset.filter(title__icontains=value) | queryset.filter(abstract__icontains=value)
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.get_ordering(request, queryset, view)
+        if not ordering:
+            return queryset
+        return queryset.order_by(*[self.order_expression(term) for term in ordering])
 
-    class Meta:
-        model = Article
-        fields = ['year', 'month', 'authors', 'tags', 'keywords']
+    def order_expression(self, term):
+        name = term.lstrip('-')
+        if name not in self.nulls_last_fields:
+            return term
+        return F(name).desc(nulls_last=True) if term.startswith('-') else F(name).asc(nulls_last=True)
 
 
 class OwnerAuthenticator(permissions.BasePermission):
@@ -61,11 +281,15 @@ class OwnerAuthenticator(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
         
-        return obj.user == request.user
+        # compare ids so the owner is never loaded
+        return obj.user_id == request.user.id
 
 class ArticleViewSet(CommonViewSet):
     queryset = Article.objects.all()
     serializer_class = ArticleSerializer
+    # deleting an author or tag drops its through rows without m2m_changed;
+    # comment writes change comment_count/last_commented_at
+    cache_models = (Article, Author, Tag, Comment)
     permission_classes_by_action = {
         'list':[permissions.IsAuthenticated],
         'create': [permissions.AllowAny], 
@@ -73,22 +297,107 @@ class ArticleViewSet(CommonViewSet):
         'update': [OwnerAuthenticator],            
         'partial_update': [OwnerAuthenticator],    
         'destroy': [OwnerAuthenticator],           
+        'bulk': [permissions.IsAuthenticated],
+        'comments': [permissions.IsAuthenticated],
+        'latest_comments': [permissions.IsAuthenticated],
+        'facets': [permissions.IsAuthenticated],
     }
+    cache_actions = ('list', 'retrieve', 'comments', 'latest_comments', 'facets')
+    # the default representation only needs related ids
+    prefetch_related_by_action = {
+        action: [
+            Prefetch('authors', queryset=Author.objects.only('id')),
+            Prefetch('tags', queryset=Tag.objects.only('id')),
+        ]
+        for action in ('list', 'retrieve', 'update', 'partial_update')
+    }
+    expand_prefetch = {'authors': 'authors', 'tags': 'tags'}
+    # an annotation rather than the column, so it survives ?fields= deferral
+    expand_annotations = {'comments_count': lambda: F('comment_count')}
+    keyset_ordering = ('-publication_date', '-id')
+    async_actions = ('list', 'retrieve')
+    values_actions = ('list',)
 
-    filter_backends = [filters.OrderingFilter, django_filters.DjangoFilterBackend]
+    filter_backends = [ArticleOrderingFilter, django_filters.DjangoFilterBackend]
     filterset_class = ArticleFilter
+    ordering_fields = ['id', 'title', 'publication_date', 'user', 'comment_count', 'last_commented_at']
 
        
+    def prepare_bulk_item(self, request, item):
+        if isinstance(item, dict) and not item.get('user'):
+            item = {**item, 'user': request.user.id}
+        return item
+
     def create(self, request, *args, **kwargs):
         if(not request.data['user']) :
             request.data['user'] = request.user.id 
         response = super().create(request, *args, **kwargs)
         return response
 
+    @action(detail=True, methods=['get'])
+    def comments(self, request, pk=None):
+        """The article's comments, oldest first, in keyset pages (?cursor=) over (article, created_at, id)."""
+        return self.cached_response(self.list_comments, request, pk=pk)
+
+    def list_comments(self, request, pk=None):
+        article = get_object_or_404(Article.objects.only('id'), pk=pk)
+        paginator = KeysetPagination(('created_at', 'id'), CustomPagination().get_page_size(request))
+        page = paginator.paginate_queryset(article.comments.select_related('user'), request, view=self)
+        return paginator.get_paginated_response(ThreadCommentSerializer(page, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def latest_comments(self, request):
+        """The newest ?limit= comments of each article in ?ids=, in one window-function query."""
+        return self.cached_response(self.list_latest_comments, request)
+
+    def list_latest_comments(self, request):
+        ids = [value for param in request.query_params.getlist('ids') for value in param.split(',') if value.strip()]
+        try:
+            ids = list(dict.fromkeys(int(value) for value in ids))
+            limit = int(request.query_params.get('limit', 3))
+        except ValueError:
+            raise ValidationError({'detail': 'ids and limit must be integers.'})
+        if not ids or len(ids) > settings.API_MAX_PAGE_SIZE:
+            raise ValidationError({'ids': f'Give between 1 and {settings.API_MAX_PAGE_SIZE} article ids.'})
+        if not 1 <= limit <= settings.API_LATEST_COMMENTS_MAX:
+            raise ValidationError({'limit': f'Must be between 1 and {settings.API_LATEST_COMMENTS_MAX}.'})
+        comments = Comment.objects.filter(article_id__in=ids).annotate(
+            position=Window(RowNumber(), partition_by=F('article_id'), order_by=(F('created_at').desc(), F('id').desc()))
+        ).filter(position__lte=limit).select_related('user').order_by('article_id', 'position')
+        threads = {article_id: [] for article_id in ids}
+        for comment in ThreadCommentSerializer(comments, many=True).data:
+            threads[comment['article']].append(comment)
+        return Response({'results': [
+            {'article': article_id, 'comments': thread} for article_id, thread in threads.items()
+        ]})
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Article counts per year, month, tag and author, under the same filters as the list."""
+        return self.cached_response(self.list_facets, request)
+
+    def list_facets(self, request):
+        return Response(article_facets(self.filter_queryset(self.get_queryset()), settings.API_FACET_SIZE))
+
+    def update(self, request, *args, **kwargs):
+        # UpdateModelMixin.update without dropping the prefetched relations:
+        # ArticleSerializer replaces the ones it writes with the new objects
+        partial = kwargs.pop('partial', False)
+        serializer = self.get_serializer(self.get_object(), data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        return Response(serializer.data)
+
 
 class CommentViewSet(CommonViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer 
+    keyset_ordering = ('-created_at', '-id')
+    filter_backends = [django_filters.DjangoFilterBackend]
+    filterset_class = CommentFilter
+    cache_models = (Comment,)
+    async_actions = ('list', 'retrieve')
+    values_actions = ('list',)
     permission_classes_by_action = {
         'list':[permissions.IsAuthenticated],
         'create': [permissions.AllowAny], 
@@ -96,8 +405,14 @@ class CommentViewSet(CommonViewSet):
         'update': [OwnerAuthenticator],            
         'partial_update': [OwnerAuthenticator],    
         'destroy': [OwnerAuthenticator],           
+        'bulk': [permissions.IsAuthenticated],
     }
        
+    def prepare_bulk_item(self, request, item):
+        if isinstance(item, dict):
+            item = {**item, 'user': request.user.id}
+        return item
+
     def create(self, request, *args, **kwargs):
         request.data['user'] = request.user.id 
         response = super().create(request, *args, **kwargs)
@@ -106,37 +421,99 @@ class CommentViewSet(CommonViewSet):
 
 
 class ArticleExport(ArticleViewSet):
+    cache_actions = ()
+    throttle_cost_by_action = {'list': settings.API_THROTTLE_EXPORT_COST}
+    async_actions = ('list',)
+    sparse_fieldset_actions = ()
+    values_actions = ()
+    prefetch_related_by_action = {'list': export_prefetch()}
+
+    # ?format=csv|jsonl|parquet (DRF's format override) or Accept picks the format
+    renderer_classes = [CSVExportRenderer, JSONLinesExportRenderer, ParquetExportRenderer]
+
     def list(self, request):
-        year = request.query_params.get('year')
-        month = request.query_params.get('month')
-        authors = request.query_params.getlist('authors')
-        tags = request.query_params.getlist('tags')
-        keywords = request.query_params.get('keywords')
-
-        queryset = Article.objects.all()
-        if year:
-            queryset = queryset.filter(publication_date__year=year)
-        if month:
-            queryset = queryset.filter(publication_date__month=month)
-        if authors:
-            queryset = queryset.filter(authors__name__in=authors)
-        if tags:
-            queryset = queryset.filter(tags__name__in=tags)
-        if keywords:
-            queryset = queryset.filter(title__icontains=keywords) | queryset.filter(abstract__icontains=keywords)
-
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="articles.csv"'
-        writer = csv.writer(response)
-        writer.writerow(['Title', 'Abstract', 'Publication Date', 'Authors', 'Tags'])
-        for article in queryset:
-            writer.writerow([
-                article.title,
-                article.abstract,
-                article.publication_date,
-                ', '.join([author.name for author in article.authors.all()]),
-                ', '.join([tag.name for tag in article.tags.all()])
-            ])
-
-        return response 
+        stream = EXPORT_STREAMS[self.get_export_format(request)][0]
+        return self.export_response(request, stream(self.get_export_queryset(request)))
+
+    async def alist(self, request):
+        stream = EXPORT_STREAMS[self.get_export_format(request)][1]
+        queryset = await sync_to_async(self.get_export_queryset)(request)
+        return self.export_response(request, stream(queryset))
+
+    def get_export_format(self, request):
+        export_format = request.accepted_renderer.format
+        if export_format == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+            raise ValidationError({'format': 'Parquet exports need pyarrow installed.'})
+        return export_format
+
+    def get_export_queryset(self, request):
+        return filter_articles(self.get_queryset(), export_params(request.query_params))
+
+    def export_response(self, request, chunks):
+        _, content_type, extension = EXPORT_FORMATS[request.accepted_renderer.format]
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="articles.{extension}"'
+        return response
+
+
+class ExportJobViewSet(PrimaryAfterWriteMixin, mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                       mixins.ListModelMixin, viewsets.GenericViewSet):
+    """Background exports: POST filters and a format, poll the job, then download it.
+
+    An identical export that is queued, running or finished within
+    API_EXPORT_MAX_AGE is returned instead of queueing a new one, so jobs
+    are shared between users; listing shows the caller's own jobs.
+    """
+    queryset = ExportJob.objects.all()
+    serializer_class = ExportJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    # a queued job is an export; polling and downloading are cheap
+    throttle_cost_by_action = {'create': settings.API_THROTTLE_EXPORT_COST}
+    pagination_class = CustomPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = queryset.filter(user_id=self.request.user.id).order_by('-created_at')
+        return queryset
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        export_format = serializer.validated_data.pop('format', 'csv')
+        params = {name: value for name, value in serializer.validated_data.items() if value not in ('', [])}
+        digest = params_hash(export_format, params)
+        job = reusable_job(export_format, digest)
+        if job is None:
+            job = ExportJob.objects.create(
+                user_id=request.user.id, format=export_format, params=params, params_hash=digest
+            )
+        headers = {'Location': request.build_absolute_uri(reverse('export-detail', args=[job.pk]))}
+        code = status.HTTP_200_OK if job.status == ExportJob.DONE else status.HTTP_202_ACCEPTED
+        return Response(self.get_serializer(job).data, status=code, headers=headers)
+
+    @action(detail=True)
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != ExportJob.DONE:
+            return Response({'detail': f'The export is {job.status}.'}, status=status.HTTP_409_CONFLICT)
+        _, content_type, extension = EXPORT_FORMATS[job.format]
+        return FileResponse(
+            job.file.open('rb'), as_attachment=True, filename=f'articles.{extension}', content_type=content_type
+        )
+
+
+class ChangeLogViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """Inserts, updates and deletes of articles and comments, oldest first.
+
+    Start with an empty ?since= (or none) and keep following ``next``;
+    ``more`` is true while entries are waiting. Entries only name the
+    object and the action, so read the current state from its endpoint.
+    """
+    queryset = ChangeLogEntry.objects.settled()
+    serializer_class = ChangeLogEntrySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ChangeFeedPagination
+    filter_backends = [django_filters.DjangoFilterBackend]
+    filterset_fields = ['model']
 
@@ -12,5 +12,10 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'deus_api.settings')
+# Under an ASGI server, serve article/comment reads and the CSV export as
+# coroutines (see articles.async_views).
+os.environ.setdefault('API_ASYNC_VIEWS', 'true')
+# Connections are not reused between ASGI requests; pool them instead.
+os.environ.setdefault('DB_POOL_MODE', 'pool')
 
 application = get_asgi_application()
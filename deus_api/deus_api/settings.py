@@ -11,7 +11,9 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
 from pathlib import Path
+import importlib.util
 import os
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +44,8 @@ ALLOWED_HOSTS = []
 #]
 
 MIDDLEWARE = [
+    'articles.profiling.ProfilingMiddleware',
+    'articles.db_routing.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,6 +85,44 @@ WSGI_APPLICATION = 'deus_api.wsgi.application'
 # Load environment variables from .env file
 load_dotenv()
 
+# How connections are reused (DB_POOL_MODE):
+#   persistent - keep each connection for DB_CONN_MAX_AGE seconds, checked
+#                before reuse; suits WSGI workers
+#   pool       - a psycopg 3 pool per process (DB_POOL_MIN_SIZE,
+#                DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT); the default under ASGI,
+#                where persistent connections are not reused between requests
+#   pgbouncer  - persistent connections to PgBouncer in transaction mode,
+#                so no server-side cursors (exports then fetch in full)
+#   none       - a new connection per request
+DB_POOL_MODE = os.getenv('DB_POOL_MODE', 'persistent')
+if DB_POOL_MODE not in ('persistent', 'pool', 'pgbouncer', 'none'):
+    raise ImproperlyConfigured(f'Unknown DB_POOL_MODE {DB_POOL_MODE!r}.')
+
+
+def database(host, port):
+    config = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv('DB_NAME'),
+        'USER': os.getenv('DB_USER'),
+        'PASSWORD': os.getenv('DB_PASSWORD'),
+        'HOST': host,
+        'PORT': port,
+        'OPTIONS': {},
+    }
+    if DB_POOL_MODE in ('persistent', 'pgbouncer'):
+        config['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', 60))
+        config['CONN_HEALTH_CHECKS'] = os.getenv('DB_CONN_HEALTH_CHECKS', 'true').lower() == 'true'
+    if DB_POOL_MODE == 'pgbouncer':
+        config['DISABLE_SERVER_SIDE_CURSORS'] = True
+    elif DB_POOL_MODE == 'pool':
+        config['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        }
+    return config
+
+
 DATABASES = {
     # 'default': {
     #     'ENGINE': 'django.db.backends.postgresql',
@@ -95,22 +137,159 @@ DATABASES = {
     #     'HOST': '$DB_HOST',
     #     'PORT': '$DB_PORT',
     # }
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': os.getenv('DB_NAME'),
-        'USER': os.getenv('DB_USER'),
-        'PASSWORD': os.getenv('DB_PASSWORD'),
-        'HOST': os.getenv('DB_HOST'),
-        'PORT': os.getenv('DB_PORT'),
+    'default': database(os.getenv('DB_HOST'), os.getenv('DB_PORT')),
+}
+# Reads of GET requests go to a streaming replica when one is configured
+# (see articles.db_routing); a client's reads stay on the primary for
+# DB_REPLICA_PIN_SECONDS after it writes.
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **database(os.getenv('DB_REPLICA_HOST'), os.getenv('DB_REPLICA_PORT', os.getenv('DB_PORT'))),
+        'TEST': {'MIRROR': 'default'},
     }
+    DATABASE_ROUTERS = ['articles.db_routing.ReplicaRouter']
+DB_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', 5))
+
+
+# How requests are authenticated:
+#   db        - load the user (and token) from the database on every request
+#   cached    - keep resolved users in the API cache for API_AUTH_CACHE_TIMEOUT
+#   stateless - trust the claims of a valid JWT, no user query at all; a
+#               deactivated user keeps access until the access token expires
+API_AUTH_MODE = os.getenv('API_AUTH_MODE', 'db')
+API_AUTH_CACHE_TIMEOUT = int(os.getenv('API_AUTH_CACHE_TIMEOUT', 60))
+AUTHENTICATION_CLASSES_BY_MODE = {
+    'db': [
+        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'rest_framework.authentication.TokenAuthentication',
+    ],
+    'cached': [
+        'articles.authentication.CachedJWTAuthentication',
+        'articles.authentication.CachedTokenAuthentication',
+    ],
+    'stateless': [
+        'rest_framework_simplejwt.authentication.JWTStatelessUserAuthentication',
+        'articles.authentication.CachedTokenAuthentication',
+    ],
 }
 
+# Render and parse JSON with orjson when it is installed.
+API_FAST_JSON = (
+    os.getenv('API_FAST_JSON', 'true').lower() == 'true'
+    and importlib.util.find_spec('orjson') is not None
+)
+# Build article/comment list pages from .values() rows instead of model
+# instances; requests with ?expand= keep the regular serializers.
+API_VALUES_SERIALIZERS = os.getenv('API_VALUES_SERIALIZERS', 'false').lower() == 'true'
 
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+    'DEFAULT_AUTHENTICATION_CLASSES': AUTHENTICATION_CLASSES_BY_MODE[API_AUTH_MODE],
+    'DEFAULT_RENDERER_CLASSES': [
+        'articles.renderers.ORJSONRenderer' if API_FAST_JSON else 'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ],
+    'DEFAULT_PARSER_CLASSES': [
+        'articles.renderers.ORJSONParser' if API_FAST_JSON else 'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': ['articles.throttling.TokenBucketThrottle'],
+}
+
+SIMPLE_JWT = {
+    'TOKEN_USER_CLASS': 'articles.authentication.StatelessUser',
+}
+
+# Caches: local memory by default, any Redis-compatible server when
+# REDIS_URL is set.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Cached API responses for list/retrieve; a timeout of 0 disables caching.
+API_CACHE_ALIAS = os.getenv('API_CACHE_ALIAS', 'default')
+API_CACHE_TIMEOUT = int(os.getenv('API_CACHE_TIMEOUT', 300))
+
+# Upper bound for the ?page_size= query parameter on every list endpoint.
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', 1000))
+
+# Most comments per article returned by /articles/latest_comments/ (?limit=).
+API_LATEST_COMMENTS_MAX = int(os.getenv('API_LATEST_COMMENTS_MAX', 50))
+
+# Tags and authors listed by /articles/facets/, most frequent first.
+API_FACET_SIZE = int(os.getenv('API_FACET_SIZE', 50))
+
+# Token-bucket throttling (see articles.throttling): requests per period for
+# each identity and scope, empty to lift a limit. Exports cost
+# API_THROTTLE_EXPORT_COST requests, and ?page_size= one per default page.
+# 'memory' keeps buckets per process, 'cache' shares them through the API cache.
+API_THROTTLE_BACKEND = os.getenv('API_THROTTLE_BACKEND', 'memory')
+if API_THROTTLE_BACKEND not in ('memory', 'cache'):
+    raise ImproperlyConfigured(f'Unknown API_THROTTLE_BACKEND {API_THROTTLE_BACKEND!r}.')
+API_THROTTLE_RATES = {
+    'user_read': os.getenv('API_THROTTLE_USER_READ', '1200/min'),
+    'user_write': os.getenv('API_THROTTLE_USER_WRITE', '300/min'),
+    'anon_read': os.getenv('API_THROTTLE_ANON_READ', '300/min'),
+    'anon_write': os.getenv('API_THROTTLE_ANON_WRITE', '60/min'),
+}
+API_THROTTLE_EXPORT_COST = int(os.getenv('API_THROTTLE_EXPORT_COST', 20))
+API_THROTTLE_MEMORY_KEYS = int(os.getenv('API_THROTTLE_MEMORY_KEYS', 100000))
+
+# Bulk endpoints (/<resource>/bulk/): items accepted per request and rows
+# per INSERT/UPDATE statement (overridable with ?batch_size=).
+API_BULK_MAX_ITEMS = int(os.getenv('API_BULK_MAX_ITEMS', 10000))
+API_BULK_BATCH_SIZE = int(os.getenv('API_BULK_BATCH_SIZE', 500))
+
+# Rows fetched per server-side cursor round trip by the CSV export.
+ARTICLE_EXPORT_CHUNK_SIZE = int(os.getenv('ARTICLE_EXPORT_CHUNK_SIZE', 2000))
+
+# Background exports (/exports/, `manage.py run_export_worker`). Files are
+# written to MEDIA_ROOT; identical requests reuse a finished file for
+# API_EXPORT_MAX_AGE seconds, and jobs are deleted after API_EXPORT_RETENTION.
+# A job running longer than API_EXPORT_JOB_TIMEOUT is handed to another worker.
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', BASE_DIR / 'media')
+API_EXPORT_MAX_AGE = int(os.getenv('API_EXPORT_MAX_AGE', 3600))
+API_EXPORT_RETENTION = int(os.getenv('API_EXPORT_RETENTION', 86400))
+API_EXPORT_JOB_TIMEOUT = int(os.getenv('API_EXPORT_JOB_TIMEOUT', 3600))
+
+# Also match partial words in titles by trigram similarity when searching
+# by keywords. Needs the pg_trgm extension.
+ARTICLE_SEARCH_TRIGRAM_FALLBACK = os.getenv('ARTICLE_SEARCH_TRIGRAM_FALLBACK', 'false').lower() == 'true'
+
+# Serve article and comment reads and the CSV export as coroutines using the
+# async ORM. Only worth it under an ASGI server; deus_api.asgi turns it on.
+API_ASYNC_VIEWS = os.getenv('API_ASYNC_VIEWS', 'false').lower() == 'true'
+
+# Per-request profiling (articles.profiling): Server-Timing headers, a JSON
+# log line per request and Prometheus metrics at /metrics/.
+API_PROFILING = os.getenv('API_PROFILING', 'false').lower() == 'true'
+# Log a warning when the same query shape runs this many times in a request.
+API_PROFILING_DUPLICATE_QUERIES = int(os.getenv('API_PROFILING_DUPLICATE_QUERIES', 5))
+# Fraction of requests run under cProfile; profiles of those slower than
+# API_PROFILING_SLOW_MS are written to API_PROFILING_DIR.
+API_PROFILING_SAMPLE_RATE = float(os.getenv('API_PROFILING_SAMPLE_RATE', 0))
+API_PROFILING_SLOW_MS = int(os.getenv('API_PROFILING_SLOW_MS', 500))
+API_PROFILING_DIR = os.getenv('API_PROFILING_DIR', '/tmp/deus_api_profiles')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'articles.profiling': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
 }
 
 # Password validation
@@ -160,6 +339,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'django_filters',
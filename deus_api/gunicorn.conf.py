@@ -0,0 +1,19 @@
+# Production server: gunicorn supervising uvicorn workers that run the ASGI
+# application, e.g. `gunicorn deus_api.asgi:application -c gunicorn.conf.py`.
+# deus_api.asgi turns on API_ASYNC_VIEWS, so article/comment reads and the
+# CSV export run as coroutines and a worker can serve many slow clients.
+import multiprocessing
+import os
+
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'uvicorn_worker.UvicornWorker'
+# long CSV exports stream for a while
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+# recycle workers now and then to cap memory growth
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = 100
+accesslog = '-'